@@ -2,28 +2,36 @@
 
 from PyQt5.QtWidgets import (
     QDialog, QFormLayout, QComboBox, QDateEdit, QLineEdit,
-    QTextEdit, QPushButton, QHBoxLayout
+    QTextEdit, QPushButton, QHBoxLayout, QCheckBox
 )
 from PyQt5.QtCore import QDate
 from i18n import tr
-from data import customer_data, vehicle_data
+from data import customer_choices, vehicle_choices, free_vehicles, fmt_num, ORDER_STATUSES
 
 
 class AddOrderDialog(QDialog):
     def __init__(self, parent=None, data=None):
         super().__init__(parent)
+        self.order_id = data.get("id") if data else None
         self.setWindowTitle(tr("add_order"))
         self.setFixedSize(400, 400)
         layout = QFormLayout(self)
 
+        # 下拉框显示姓名/车牌，item data 里存外键 id
         self.customer = QComboBox()
-        self.customer.addItems([c["name"] for c in customer_data])
+        for cid, name in customer_choices():
+            self.customer.addItem(name, cid)
         layout.addRow(tr("customer_name"), self.customer)
 
         self.vehicle = QComboBox()
-        self.vehicle.addItems([v["plate"] for v in vehicle_data])
+        for vid, plate in vehicle_choices():
+            self.vehicle.addItem(plate, vid)
         layout.addRow(tr("vehicle_plate"), self.vehicle)
 
+        # 勾选后车辆下拉框只列出起止日期内没有其它订单的车
+        self.only_free = QCheckBox(tr("only_free_vehicles"))
+        layout.addRow("", self.only_free)
+
         self.start_date = QDateEdit()
         self.start_date.setCalendarPopup(True)
         self.start_date.setDate(QDate.currentDate())
@@ -35,7 +43,8 @@ class AddOrderDialog(QDialog):
         layout.addRow(tr("end_date"), self.end_date)
 
         self.status = QComboBox()
-        self.status.addItems([tr("ongoing"), tr("completed"), tr("overdue"), tr("cancelled")])
+        for code in ORDER_STATUSES:
+            self.status.addItem(tr(code), code)
         layout.addRow(tr("order_status"), self.status)
 
         self.amount = QLineEdit()
@@ -56,21 +65,40 @@ class AddOrderDialog(QDialog):
 
         # 如果传入了已有数据（编辑模式）
         if data:
-            self.customer.setCurrentText(data["customer"])
-            self.vehicle.setCurrentText(data["vehicle"])
+            self.customer.setCurrentIndex(self.customer.findData(data["customer_id"]))
+            self.vehicle.setCurrentIndex(self.vehicle.findData(data["vehicle_id"]))
             self.start_date.setDate(QDate.fromString(data["start_date"], "yyyy-MM-dd"))
             self.end_date.setDate(QDate.fromString(data["end_date"], "yyyy-MM-dd"))
-            self.status.setCurrentText(tr(data["status"]))
-            self.amount.setText(data["amount"])
+            self.status.setCurrentIndex(self.status.findData(data["status"]))
+            self.amount.setText(fmt_num(data["amount"]))
             self.remark.setPlainText(data["remark"])
 
+        self.only_free.toggled.connect(self.reload_vehicles)
+        self.start_date.dateChanged.connect(self.reload_vehicles)
+        self.end_date.dateChanged.connect(self.reload_vehicles)
+
+    def reload_vehicles(self):
+        """按起止日期重新列出车辆，原来选中的车还在列表里就保持选中"""
+        if self.only_free.isChecked():
+            choices = free_vehicles(self.start_date.date().toString("yyyy-MM-dd"),
+                                    self.end_date.date().toString("yyyy-MM-dd"), self.order_id)
+        else:
+            choices = vehicle_choices()
+        current = self.vehicle.currentData()
+        self.vehicle.clear()
+        for vid, plate in choices:
+            self.vehicle.addItem(plate, vid)
+        self.vehicle.setCurrentIndex(max(self.vehicle.findData(current), 0))
+
     def get_data(self):
         return {
+            "customer_id": self.customer.currentData(),
+            "vehicle_id": self.vehicle.currentData(),
             "customer": self.customer.currentText(),
             "vehicle": self.vehicle.currentText(),
             "start_date": self.start_date.date().toString("yyyy-MM-dd"),
             "end_date": self.end_date.date().toString("yyyy-MM-dd"),
-            "status": self.status.currentText(),
+            "status": self.status.currentData(),
             "amount": self.amount.text(),
             "remark": self.remark.toPlainText(),
         }
\ No newline at end of file
@@ -1,25 +1,23 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem,
     QPushButton, QHBoxLayout, QDialog, QFormLayout, QLineEdit, QComboBox, QTextEdit,
-    QMessageBox, QFileDialog, QCheckBox, QDialogButtonBox
+    QMessageBox, QFileDialog, QCheckBox, QDialogButtonBox, QApplication
 )
 from PyQt5.QtCore import Qt
-import csv
 from i18n import tr, register_page
-from data import save_all_data, customer_data, order_data
+from widgets import PageBar, LiveSearch, start_export, start_import
+from export import EXPORT_FILE_NAMES
+from table_model import RecordTableModel, ButtonDelegate, make_view, PAGE_SIZE, FETCH_SIZE
+from data import (insert_customer, update_customer, delete_customer, KeysetPager, get_customer,
+                  DuplicateError, orders_for_customer, customer_stats, count_dependents, ReferencedError, fmt_num,
+                  CUSTOMER_STATUSES)
 
+STATS_FIRST_COLUMN = 7  # "查看历史"之后是可选的统计列（customer_stats）
 
-# ========== 辅助函数 ==========
-def generate_new_customer_id():
-    if not customer_data:
-        return 1
-    return max(int(c.get("id", 0)) for c in customer_data) + 1
 
+# ========== 辅助函数 ==========
 def find_customer_by_id(cid):
-    for i, c in enumerate(customer_data):
-        if str(c.get("id")) == str(cid):
-            return i, c
-    return None
+    return get_customer(int(cid))
 
 
 # ========== 新增/编辑客户对话框 ==========
@@ -40,7 +38,8 @@ class AddCustomerDialog(QDialog):
         layout.addRow(self.is_corporate)
 
         self.status = QComboBox()
-        self.status.addItems([tr("normal"), tr("vip"), tr("blacklist")])
+        for code in CUSTOMER_STATUSES:
+            self.status.addItem(tr(code), code)
         layout.addRow(tr("status"), self.status)
 
         self.remark = QTextEdit()
@@ -57,7 +56,7 @@ class AddCustomerDialog(QDialog):
             self.name.setText(data["name"])
             self.phone.setText(data["phone"])
             self.is_corporate.setChecked(data["is_corporate"])
-            self.status.setCurrentText(tr(data["status"]))
+            self.status.setCurrentIndex(self.status.findData(data["status"]))
             self.remark.setPlainText(data["remark"])
 
     def get_data(self):
@@ -66,31 +65,36 @@ class AddCustomerDialog(QDialog):
             "name": self.name.text(),
             "phone": self.phone.text(),
             "is_corporate": self.is_corporate.isChecked(),
-            "status": self.status.currentText(),
+            "status": self.status.currentData(),
             "remark": self.remark.toPlainText(),
         }
 
 
 # ========== 历史订单对话框 ==========
 class OrderHistoryDialog(QDialog):
-    def __init__(self, customer_name, parent=None):
+    def __init__(self, customer_id, customer_name, parent=None):
         super().__init__(parent)
         self.setWindowTitle(tr("order_history") + f" - {customer_name}")
-        self.setFixedSize(600, 300)
+        self.setFixedSize(600, 320)
         layout = QVBoxLayout(self)
+        stats = customer_stats(customer_id)
+        if stats:
+            layout.addWidget(QLabel(tr("customer_stats_summary").format(
+                stats["order_count"], fmt_num(stats["total_billed"]), stats["overdue_count"],
+                stats["unpaid_fines"], fmt_num(stats["unpaid_fine_amount"]), stats["last_rental"] or "-")))
         self.table = QTableWidget()
         self.table.setColumnCount(5)
         self.table.setHorizontalHeaderLabels([
             tr("order_id"), tr("vehicle_plate"), tr("start_date"), tr("end_date"), tr("total_amount")
         ])
-        orders = [o for o in order_data if o["customer"] == customer_name]
+        orders = orders_for_customer(customer_id)
         self.table.setRowCount(len(orders))
         for i, o in enumerate(orders):
             self.table.setItem(i, 0, QTableWidgetItem(str(o.get("id", i+1))))
             self.table.setItem(i, 1, QTableWidgetItem(o.get("vehicle", "")))
             self.table.setItem(i, 2, QTableWidgetItem(o.get("start_date", "")))
             self.table.setItem(i, 3, QTableWidgetItem(o.get("end_date", "")))
-            self.table.setItem(i, 4, QTableWidgetItem(o.get("amount", "")))
+            self.table.setItem(i, 4, QTableWidgetItem(fmt_num(o.get("amount"))))
         layout.addWidget(self.table)
         btn = QPushButton(tr("ok"))
         btn.clicked.connect(self.accept)
@@ -101,10 +105,8 @@ class OrderHistoryDialog(QDialog):
 class CustomerPage(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.page_size = 10
-        self.current_page = 1
-        self.search_text = ""
-        self.sort_reverse = False
+        self.page_size = PAGE_SIZE
+        self.pager = KeysetPager("customers", self.page_size, FETCH_SIZE)
 
         layout = QVBoxLayout(self)
         self.title = QLabel(tr("customer_manage"))
@@ -118,6 +120,7 @@ class CustomerPage(QWidget):
         search_btn = QPushButton(tr("search"))
         self.search_btn = search_btn
         search_btn.clicked.connect(self.do_search)
+        self.search_edit.returnPressed.connect(self.do_search)
         search_layout.addWidget(self.search_edit)
         search_layout.addWidget(search_btn)
         search_layout.addStretch()
@@ -128,43 +131,52 @@ class CustomerPage(QWidget):
         self.btn_add = QPushButton(tr("add_customer"))
         self.btn_delete = QPushButton(tr("delete_customer"))
         self.btn_export = QPushButton(tr("export_csv"))
+        self.btn_import = QPushButton(tr("import_csv"))
         btn_layout.addWidget(self.btn_add)
         btn_layout.addWidget(self.btn_delete)
         btn_layout.addWidget(self.btn_export)
+        btn_layout.addWidget(self.btn_import)
         btn_layout.addStretch()
+        self.chk_stats = QCheckBox(tr("show_stats_columns"))
+        btn_layout.addWidget(self.chk_stats)
         layout.addLayout(btn_layout)
 
         # 表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels([
-            tr("customer_id"), tr("name"), tr("phone"), tr("is_corporate"),
-            tr("status"), tr("remark"), tr("order_history")
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSortingEnabled(False)
+        self.model = RecordTableModel(self.pager, [
+            ("customer_id", lambda c: str(c["id"]), "id"), ("name", lambda c: c["name"], "name"),
+            ("phone", lambda c: c["phone"], "phone"),
+            ("is_corporate", lambda c: tr("yes") if c["is_corporate"] else tr("no"), "is_corporate"),
+            ("status", lambda c: tr(c["status"]), "status"), ("remark", lambda c: c["remark"], "remark"),
+            ("order_history", lambda c: tr("view_history")),
+            # 以下为可选的统计列，来自 customer_stats
+            ("order_count", lambda c: str(c["order_count"]), "order_count"),
+            ("total_billed", lambda c: fmt_num(c["total_billed"]), "total_billed"),
+            ("overdue_count", lambda c: str(c["overdue_count"]), "overdue_count"),
+            ("unpaid_fines", lambda c: str(c["unpaid_fines"]), "unpaid_fines"),
+            ("unpaid_fine_amount", lambda c: fmt_num(c["unpaid_fine_amount"]), "unpaid_fine_amount"),
+            ("last_rental", lambda c: c["last_rental"], "last_rental"),
+        ], parent=self)
+        self.table = make_view(self.model)
+        self.show_stats_columns(False)
+        self.history_delegate = ButtonDelegate(self.table)
+        self.table.setItemDelegateForColumn(6, self.history_delegate)
+        self.table.setMouseTracking(True)
         layout.addWidget(self.table)
 
         # 分页
-        page_layout = QHBoxLayout()
-        self.btn_prev = QPushButton(tr("prev_page"))
-        self.btn_next = QPushButton(tr("next_page"))
-        self.lbl_page = QLabel()
-        page_layout.addStretch()
-        page_layout.addWidget(self.btn_prev)
-        page_layout.addWidget(self.lbl_page)
-        page_layout.addWidget(self.btn_next)
-        page_layout.addStretch()
-        layout.addLayout(page_layout)
+        self.page_bar = PageBar(self.pager)
+        layout.addWidget(self.page_bar)
+        self.live_search = LiveSearch(self.search_edit, self.model, self.page_bar, self)
 
         # 信号连接
         self.btn_add.clicked.connect(self.add_customer)
         self.btn_delete.clicked.connect(self.delete_customer)
         self.btn_export.clicked.connect(self.export_csv)
-        self.table.cellDoubleClicked.connect(self.edit_or_history)
-        self.btn_prev.clicked.connect(self.prev_page)
-        self.btn_next.clicked.connect(self.next_page)
+        self.btn_import.clicked.connect(self.import_csv)
+        self.chk_stats.toggled.connect(self.show_stats_columns)
+        self.table.doubleClicked.connect(lambda idx: self.edit_or_history(idx.row(), idx.column()))
+        self.history_delegate.clicked.connect(self.on_history_clicked)
+        self.page_bar.page_changed.connect(self.show_page)
         self.table.horizontalHeader().sectionClicked.connect(self.sort_by_column)
 
         register_page(self)
@@ -176,68 +188,44 @@ class CustomerPage(QWidget):
         self.btn_add.setText(tr("add_customer"))
         self.btn_delete.setText(tr("delete_customer"))
         self.btn_export.setText(tr("export_csv"))
-        self.btn_prev.setText(tr("prev_page"))
-        self.btn_next.setText(tr("next_page"))
+        self.btn_import.setText(tr("import_csv"))
+        self.chk_stats.setText(tr("show_stats_columns"))
+        self.page_bar.refresh_texts()
         self.search_edit.setPlaceholderText(tr("search_customer_placeholder"))
         self.search_btn.setText(tr("search"))
-        self.table.setHorizontalHeaderLabels([
-            tr("customer_id"), tr("name"), tr("phone"), tr("is_corporate"),
-            tr("status"), tr("remark"), tr("order_history")
-        ])
-        self.refresh_table()
+        self.model.retranslate()
 
     # ===== 排序逻辑 =====
     def sort_by_column(self, column):
-        self.sort_reverse = not getattr(self, "sort_reverse", False)
-        col_map = {0:"id",1:"name",2:"phone",3:"is_corporate",4:"status",5:"remark"}
-        key = col_map.get(column)
+        # Shift+单击表头：在已有排序后面再加一列
+        key = self.model.sort_column(column)
         if not key: return
-
-        def sort_key(x):
-            val = x.get(key, "")
-            if isinstance(val, bool): return str(val)
-            if isinstance(val, str) and val.isdigit(): return int(val)
-            return str(val).lower()
-
-        customer_data.sort(key=sort_key, reverse=self.sort_reverse)
-        self.refresh_table()
+        self.pager.toggle_sort(key, append=bool(QApplication.keyboardModifiers() & Qt.ShiftModifier))
+        self.show_page()
 
     # ===== 搜索 + 刷新表格 =====
     def do_search(self):
-        self.search_text = self.search_edit.text().strip()
-        self.current_page=1; self.refresh_table()
-
-    def get_filtered_data(self):
-        if not self.search_text: return customer_data
-        return [c for c in customer_data if self.search_text.lower() in c["name"].lower() or self.search_text in c["phone"]]
+        self.live_search.cancel()
+        self.pager.set_query(search=self.search_edit.text().strip()); self.show_page()
 
     def get_selected_customer(self,row):
-        item=self.table.item(row,0)
-        if not item:return None
-        return find_customer_by_id(item.text())
+        c=self.model.record(row)
+        if not c:return None
+        return find_customer_by_id(c["id"])
 
     def refresh_table(self):
-        filtered=self.get_filtered_data()
-        total=len(filtered); total_pages=max(1,(total+self.page_size-1)//self.page_size)
-        self.current_page=min(self.current_page,total_pages)
-        start=(self.current_page-1)*self.page_size; end=min(start+self.page_size,total)
-        page_data=filtered[start:end]
-
-        self.table.setRowCount(len(page_data))
-        for row,c in enumerate(page_data):
-            self.table.setItem(row,0,QTableWidgetItem(str(c.get("id",""))))
-            self.table.setItem(row,1,QTableWidgetItem(c["name"]))
-            self.table.setItem(row,2,QTableWidgetItem(c["phone"]))
-            self.table.setItem(row,3,QTableWidgetItem(tr("yes") if c["is_corporate"] else tr("no")))
-            self.table.setItem(row,4,QTableWidgetItem(tr(c["status"])))
-            self.table.setItem(row,5,QTableWidgetItem(c["remark"]))
-            btn=QPushButton(tr("view_history"))
-            btn.clicked.connect(lambda _,n=c["name"]:self.show_history(n))
-            self.table.setCellWidget(row,6,btn)
-
-        self.lbl_page.setText(tr("page_info").format(self.current_page,total_pages,total))
-        self.btn_prev.setEnabled(self.current_page>1)
-        self.btn_next.setEnabled(self.current_page<total_pages)
+        self.pager.reload(); self.model.refresh(); self.page_bar.update_state()
+
+    def show_page(self):
+        self.model.reset(); self.page_bar.update_state()
+
+    def show_stats_columns(self,visible):
+        for col in range(STATS_FIRST_COLUMN,self.model.columnCount()):
+            self.table.setColumnHidden(col,not visible)
+
+    def on_history_clicked(self,row):
+        c=self.model.record(row)
+        if c: self.show_history(c["id"],c["name"])
 
     # ===== CRUD =====
     def add_customer(self):
@@ -248,32 +236,39 @@ class CustomerPage(QWidget):
                 QMessageBox.warning(self,tr("tip"),tr("name_phone_required"));return
             if not data["phone"].isdigit()or len(data["phone"])<6:
                 QMessageBox.warning(self,tr("tip"),tr("phone_invalid"));return
-            if any(c["phone"]==data["phone"] for c in customer_data):
+            try: insert_customer(data)
+            except DuplicateError:
                 QMessageBox.warning(self,tr("tip"),tr("phone_exists"));return
-            for k in ["normal","vip","blacklist"]:
-                if data["status"]==tr(k): data["status"]=k
-            data["id"]=generate_new_customer_id()
-            customer_data.append(data); save_all_data(); self.refresh_table()
+            self.refresh_table()
 
     def delete_customer(self):
-        row=self.table.currentRow()
+        row=self.table.currentIndex().row()
         if row==-1:
             QMessageBox.warning(self,tr("tip"),tr("select_customer"));return
-        result=self.get_selected_customer(row)
-        if not result:return
-        idx,customer=result
-        reply=QMessageBox.question(self,tr("delete_customer"),tr("confirm_delete_customer").format(customer["name"]),QMessageBox.Yes|QMessageBox.No)
+        customer=self.get_selected_customer(row)
+        if not customer:return
+        if self.warn_referenced(customer):return
+        msg=tr("confirm_delete_customer").format(customer["name"])
+        reply=QMessageBox.question(self,tr("delete_customer"),msg,QMessageBox.Yes|QMessageBox.No)
         if reply==QMessageBox.Yes:
-            del customer_data[idx]; save_all_data(); self.refresh_table()
+            try:
+                delete_customer(customer["id"])
+            except ReferencedError:
+                # 确认期间（如后台导入）又有订单或罚款引用了它
+                self.warn_referenced(customer)
+            self.refresh_table()
+
+    def warn_referenced(self,customer):
+        """还有订单或罚款引用它时提示不能删除，返回是否有引用"""
+        n_orders,n_fines=count_dependents("customer_id",customer["id"])
+        if n_orders or n_fines:
+            QMessageBox.warning(self,tr("delete_customer"),tr("delete_referenced").format(customer["name"],n_orders,n_fines))
+        return bool(n_orders or n_fines)
 
     def edit_or_history(self,row,column):
-        if column==6:
-            name=self.table.item(row,1).text()
-            self.show_history(name)
-        else:
-            result=self.get_selected_customer(row)
-            if not result:return
-            idx,data=result
+        if column!=6:
+            data=self.get_selected_customer(row)
+            if not data:return
             dialog=AddCustomerDialog(self,data)
             if dialog.exec_():
                 new_data=dialog.get_data()
@@ -281,33 +276,24 @@ class CustomerPage(QWidget):
                     QMessageBox.warning(self,tr("tip"),tr("name_phone_required"));return
                 if not new_data["phone"].isdigit()or len(new_data["phone"])<6:
                     QMessageBox.warning(self,tr("tip"),tr("phone_invalid"));return
-                if any(c["phone"]==new_data["phone"] and c is not data for c in customer_data):
-                    QMessageBox.warning(self,tr("tip"),tr("phone_exists"));return
-                for k in ["normal","vip","blacklist"]:
-                    if new_data["status"]==tr(k): new_data["status"]=k
                 new_data["id"]=data["id"]
-                customer_data[idx]=new_data; save_all_data(); self.refresh_table()
+                try: update_customer(new_data)
+                except DuplicateError:
+                    QMessageBox.warning(self,tr("tip"),tr("phone_exists"));return
+                self.refresh_table()
 
-    def show_history(self,customer_name):
-        dlg=OrderHistoryDialog(customer_name,self)
+    def show_history(self,customer_id,customer_name):
+        dlg=OrderHistoryDialog(customer_id,customer_name,self)
         dlg.exec_()
 
     # ===== 分页 & 导出 =====
-    def prev_page(self):
-        if self.current_page>1:self.current_page-=1; self.refresh_table()
-    def next_page(self):
-        total=len(self.get_filtered_data()); total_pages=max(1,(total+self.page_size-1)//self.page_size)
-        if self.current_page<total_pages:self.current_page+=1; self.refresh_table()
 
     def export_csv(self):
-        path,_=QFileDialog.getSaveFileName(self,tr("export_csv"),"客户列表.csv","CSV Files (*.csv)")
+        path,_=QFileDialog.getSaveFileName(self,tr("export_csv"),EXPORT_FILE_NAMES["customers"],"CSV Files (*.csv)")
+        if not path:return
+        start_export(self,path,"customers",self.pager.search,self.pager.sort)
+
+    def import_csv(self):
+        path,_=QFileDialog.getOpenFileName(self,tr("import_csv"),"","CSV Files (*.csv)")
         if not path:return
-        try:
-            with open(path,"w",newline='',encoding="utf-8-sig") as f:
-                writer=csv.writer(f)
-                writer.writerow([tr("customer_id"),tr("name"),tr("phone"),tr("is_corporate"),tr("status"),tr("remark")])
-                for c in self.get_filtered_data():
-                    writer.writerow([c["id"],c["name"],c["phone"],tr("yes") if c["is_corporate"] else tr("no"),tr(c["status"]),c["remark"]])
-            QMessageBox.information(self,tr("export_csv"),tr("export_success"))
-        except Exception as e:
-            QMessageBox.critical(self,tr("export_csv"),tr("export_failed")+"\n"+str(e))
\ No newline at end of file
+        start_import(self,path,"customers",self.refresh_table)
\ No newline at end of file
@@ -1,30 +1,231 @@
-import sqlite3, json, os
+import sqlite3, json, os, re, codecs
 
 DB_FILE = "rental.db"
+DB_CONFIG_FILE = "db_config.json"
 
-vehicle_data = []
-customer_data = []
-order_data = []
-fine_data = []
+# 连接调优参数，可在 db_config.json 中覆盖，例如：
+# {"pragmas": {"cache_size": -65536, "mmap_size": 536870912}, "statement_cache_size": 512}
+DB_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,       # 负数单位为 KiB，约 20MB 页缓存
+    "mmap_size": 268435456,     # 256MB 内存映射
+    "temp_store": "MEMORY",
+}
+STATEMENT_CACHE_SIZE = 256
+
+_conn = None
+_config_loaded = False
+_started = False
+
+
+def load_db_config(path=DB_CONFIG_FILE):
+    """读取 db_config.json 覆盖默认连接参数（文件不存在则保持默认）"""
+    global STATEMENT_CACHE_SIZE, _config_loaded
+    _config_loaded = True
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    DB_PRAGMAS.update(cfg.get("pragmas", {}))
+    STATEMENT_CACHE_SIZE = int(cfg.get("statement_cache_size", STATEMENT_CACHE_SIZE))
+
+
+def _apply_pragmas(conn):
+    for name, value in DB_PRAGMAS.items():
+        if not re.fullmatch(r"\w+", name) or not re.fullmatch(r"-?\w+", str(value)):
+            raise ValueError(f"非法的 PRAGMA 配置: {name}={value}")
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def open_conn():
+    """新建一个按配置调优过的连接（后台线程需要各自的连接）"""
+    conn = sqlite3.connect(DB_FILE, cached_statements=STATEMENT_CACHE_SIZE)
+    _apply_pragmas(conn)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
 
 
 def get_conn():
-    return sqlite3.connect(DB_FILE)
+    """返回进程内共享的长连接，首次调用时打开"""
+    global _conn
+    if _conn is None:
+        if not _config_loaded:
+            load_db_config()
+        _conn = open_conn()
+    return _conn
 
 
-def init_db():
-    """初始化表"""
-    conn = get_conn()
-    cur = conn.cursor()
+def close_conn():
+    """关闭共享连接（退出时调用，会顺带完成 WAL checkpoint）"""
+    global _conn
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def configure_db(pragmas=None, statement_cache_size=None):
+    """运行时调整连接参数，下次 get_conn() 时按新参数重新打开"""
+    global STATEMENT_CACHE_SIZE
+    if pragmas:
+        DB_PRAGMAS.update(pragmas)
+    if statement_cache_size is not None:
+        STATEMENT_CACHE_SIZE = int(statement_cache_size)
+    close_conn()
+
+
+BACKUP_STEP_PAGES = 256     # 每步复制的页数，步与步之间让出写锁
+
+
+def backup_db(path, progress=None, step_pages=BACKUP_STEP_PAGES):
+    """用 SQLite 在线备份 API 把当前库复制到 path，得到一致的快照。
+    progress(remaining, total) 每步回调一次，抛异常即中止。先写临时文件，校验通过后再替换目标文件；
+    返回 integrity_check 的结果，'ok' 表示备份完好。可在后台线程调用（使用独立连接）"""
+    tmp = path + ".part"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    src, dst = open_conn(), sqlite3.connect(tmp)
+    try:
+        src.backup(dst, pages=step_pages, sleep=0.005,
+                   progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None)
+        dst.execute("PRAGMA journal_mode = DELETE")  # 备份文件不带 -wal，单文件即可拷走
+        result = dst.execute("PRAGMA integrity_check").fetchone()[0]
+    except BaseException:
+        dst.close()
+        os.remove(tmp)
+        raise
+    finally:
+        src.close()
+    dst.close()
+    if result == "ok":
+        os.replace(tmp, path)
+    else:
+        os.remove(tmp)
+    return result
+
+
+# ========== 表结构 & 版本迁移 ==========
+# 库文件版本记在 PRAGMA user_version 里，每个迁移函数把库从上一版本升到下一版本
+SCHEMA_VERSION = 10
+
+# 日期在库里存 yyyymmdd 整数，可直接排序和做范围查询；对外仍是 'yyyy-MM-dd' 字符串
+_DATE_COLUMNS = {"insurance", "start_date", "end_date", "fine_date", "last_rental"}
+_INT_COLUMNS = {"year", "mileage", "order_count", "overdue_count", "unpaid_fines"}
+_REAL_COLUMNS = {"monthly_price", "deposit", "amount", "total_billed", "unpaid_fine_amount"}
+
+VEHICLE_COLUMNS = ("plate", "model", "year", "insurance", "mileage", "monthly_price", "deposit", "remark")
+CUSTOMER_COLUMNS = ("name", "phone", "is_corporate", "status", "remark")
+ORDER_COLUMNS = ("customer_id", "vehicle_id", "start_date", "end_date", "status", "amount", "remark")
+FINE_COLUMNS = ("vehicle_id", "customer_id", "fine_type", "amount", "fine_date", "paid", "remark")
+
+ORDER_ID_BASE = 1001    # 订单号从 1001 开始
+
+# 状态码（库里存的值，同时是 i18n key）
+CUSTOMER_STATUSES = ("normal", "vip", "blacklist")
+ORDER_STATUSES = ("ongoing", "completed", "overdue", "cancelled")
+
+# 订单/罚款读取时通过视图带出客户姓名和车牌，仅用于显示和搜索
+ORDER_LIST_COLUMNS = ORDER_COLUMNS + ("customer", "vehicle")
+FINE_LIST_COLUMNS = FINE_COLUMNS + ("vehicle", "customer")
+
+# 客户汇总（customer_stats，由触发器随订单/罚款增删改同步），客户列表通过视图一并读出
+CUSTOMER_STATS_COLUMNS = ("order_count", "total_billed", "overdue_count",
+                          "unpaid_fines", "unpaid_fine_amount", "last_rental")
+CUSTOMER_LIST_COLUMNS = CUSTOMER_COLUMNS + CUSTOMER_STATS_COLUMNS
+
+# 布尔字段在库里存 0/1
+_BOOL_COLUMNS = {"is_corporate", "paid"}
+_REF_COLUMNS = {"customer_id", "vehicle_id"}
+_TYPED_COLUMNS = _BOOL_COLUMNS | _DATE_COLUMNS | _INT_COLUMNS | _REAL_COLUMNS | _REF_COLUMNS
+
+
+def date_to_int(value):
+    """'2024-01-31' -> 20240131；空值返回 None，格式不对的原样返回"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, int):
+        return value
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+        return int(value.replace("-", ""))
+    return value
+
+
+def int_to_date(value):
+    """20240131 -> '2024-01-31'"""
+    if value is None:
+        return ""
+    if isinstance(value, int):
+        s = str(value)
+        return f"{s[:4]}-{s[4:6]}-{s[6:]}"
+    return str(value)
+
+
+def _to_number(value, integer=False):
+    """界面传来的字符串转成数字；解析不了的保持原样（与 SQLite 的类型亲和一致）"""
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return int(value) if integer and float(value).is_integer() else value
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        num = float(text)
+    except ValueError:
+        return value
+    return int(num) if integer and num.is_integer() else num
+
+
+def fmt_num(value):
+    """数字转显示文本：1500.0 -> '1500'，12.50 -> '12.5'"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return ("%.2f" % value).rstrip("0").rstrip(".")
+    return str(value)
+
+
+def _transaction(conn):
+    """DDL 也要放进事务里，sqlite3 默认不会为 CREATE/DROP 自动开启事务"""
+    conn.execute("BEGIN")
+    return conn
+
+
+# 订单、罚款引用客户/车辆；还有订单或罚款的客户/车辆不能删除（RESTRICT），账目不会跟着消失
+_ORDERS_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER REFERENCES customers(id) ON DELETE RESTRICT,
+        vehicle_id INTEGER REFERENCES vehicles(id) ON DELETE RESTRICT,
+        start_date INTEGER, end_date INTEGER,
+        status TEXT, amount REAL, remark TEXT
+    )"""
+
+_FINES_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        vehicle_id INTEGER REFERENCES vehicles(id) ON DELETE RESTRICT,
+        customer_id INTEGER REFERENCES customers(id) ON DELETE RESTRICT,
+        fine_type TEXT, amount REAL,
+        fine_date INTEGER, paid INTEGER,
+        remark TEXT
+    )"""
+
 
+def _create_schema(cur):
+    """建最新版本的表"""
     # 车辆表
     cur.execute("""
     CREATE TABLE IF NOT EXISTS vehicles (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         plate TEXT NOT NULL UNIQUE,
-        model TEXT, year TEXT, insurance TEXT,
-        mileage TEXT, monthly_price TEXT,
-        deposit TEXT, remark TEXT
+        model TEXT, year INTEGER, insurance INTEGER,
+        mileage INTEGER, monthly_price REAL,
+        deposit REAL, remark TEXT
     )""")
 
     # 客户表
@@ -35,145 +236,1370 @@ def init_db():
         is_corporate INTEGER, status TEXT, remark TEXT
     )""")
 
-    # 订单表
+    # 订单表、罚款表
+    cur.execute(_ORDERS_DDL.format(table="orders"))
+    cur.execute(_FINES_DDL.format(table="fines"))
+
+    _seed_order_ids(cur)
+    _create_meta(cur)
+    _create_indexes(cur)
+    _create_views(cur)
+    _create_customer_stats(cur)
+    _create_order_spans(cur)
+    _create_search_index(cur)
+
+
+def _seed_order_ids(cur):
+    """id 由 AUTOINCREMENT 分配；把 orders 的序号抬到 ORDER_ID_BASE - 1，新订单号从 ORDER_ID_BASE 起"""
+    cur.execute("INSERT INTO sqlite_sequence (name, seq) SELECT 'orders', 0 "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'orders')")
+    cur.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'orders' AND seq < ?",
+                (ORDER_ID_BASE - 1, ORDER_ID_BASE - 1))
+
+
+def _create_meta(cur):
+    # 键值小表：记录 JSON 是否已导入等一次性启动步骤的完成状态
+    cur.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+
+
+def _create_indexes(cur):
+    # 保险到期、订单到期都是按日期做范围查询
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_insurance ON vehicles(insurance)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_end ON orders(status, end_date)")
+    # 外键列：历史订单、罚款查询和删除客户/车辆前的引用检查都靠它们
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_vehicle ON orders(vehicle_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_customer ON fines(customer_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_vehicle ON fines(vehicle_id)")
+    _create_sort_indexes(cur)
+
+
+def _create_sort_indexes(cur):
+    # 分页按这些列排序；文本列用 NOCASE，和 ORDER BY ... COLLATE NOCASE 对得上
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_model ON vehicles(model COLLATE NOCASE)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_year ON vehicles(year)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_mileage ON vehicles(mileage)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_price ON vehicles(monthly_price)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_deposit ON vehicles(deposit)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customers_name ON customers(name COLLATE NOCASE)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customers_status ON customers(status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customers_remark ON customers(remark COLLATE NOCASE)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customers_corporate ON customers(is_corporate)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_start ON orders(start_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_end ON orders(end_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_amount ON orders(amount)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_remark ON orders(remark COLLATE NOCASE)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_date ON fines(fine_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_amount ON fines(amount)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_paid ON fines(paid)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_type ON fines(fine_type COLLATE NOCASE)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_remark ON fines(remark COLLATE NOCASE)")
+
+
+def _create_views(cur):
+    cur.execute("DROP VIEW IF EXISTS order_list")
     cur.execute("""
-    CREATE TABLE IF NOT EXISTS orders (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        customer TEXT, vehicle TEXT,
-        start_date TEXT, end_date TEXT,
-        status TEXT, amount TEXT, remark TEXT
+    CREATE VIEW order_list AS
+    SELECT o.*, c.name AS customer, v.plate AS vehicle
+    FROM orders o
+    LEFT JOIN customers c ON c.id = o.customer_id
+    LEFT JOIN vehicles v ON v.id = o.vehicle_id""")
+
+    cur.execute("DROP VIEW IF EXISTS fine_list")
+    cur.execute("""
+    CREATE VIEW fine_list AS
+    SELECT f.*, v.plate AS vehicle, c.name AS customer
+    FROM fines f
+    LEFT JOIN vehicles v ON v.id = f.vehicle_id
+    LEFT JOIN customers c ON c.id = f.customer_id""")
+
+
+def _billed(row):
+    # 取消的订单不计入订单数、累计金额和最近租车日期
+    return f"coalesce({row}.status, '') <> 'cancelled'"
+
+
+def _order_stats_delta(sign, row):
+    return (f"order_count = order_count {sign} ({_billed(row)}), "
+            f"total_billed = total_billed {sign} CASE WHEN {_billed(row)} THEN coalesce({row}.amount, 0) ELSE 0 END, "
+            f"overdue_count = overdue_count {sign} ({row}.status = 'overdue')")
+
+
+def _fine_stats_delta(sign, row):
+    return (f"unpaid_fines = unpaid_fines {sign} (NOT coalesce({row}.paid, 0)), "
+            f"unpaid_fine_amount = unpaid_fine_amount {sign} "
+            f"CASE WHEN coalesce({row}.paid, 0) THEN 0 ELSE coalesce({row}.amount, 0) END")
+
+
+_LAST_RENTAL = ("(SELECT MAX(start_date) FROM orders o "
+                f"WHERE o.customer_id = customer_stats.customer_id AND {_billed('o')})")
+
+
+def _create_customer_stats(cur):
+    """每个客户一行汇总：订单数、累计金额、逾期单数、未缴罚款、最近一次租车日期。
+    触发器只按变化量加减（订单改为/改回取消时相应减去/加回），最近租车日期只在删改订单时按 idx_orders_customer 查该客户自己的订单"""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS customer_stats (
+        customer_id INTEGER PRIMARY KEY REFERENCES customers(id) ON DELETE CASCADE,
+        order_count INTEGER NOT NULL DEFAULT 0, total_billed REAL NOT NULL DEFAULT 0,
+        overdue_count INTEGER NOT NULL DEFAULT 0,
+        unpaid_fines INTEGER NOT NULL DEFAULT 0, unpaid_fine_amount REAL NOT NULL DEFAULT 0,
+        last_rental INTEGER
     )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_stats_orders ON customer_stats(order_count)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_stats_billed ON customer_stats(total_billed)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_stats_last ON customer_stats(last_rental)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_stats_overdue ON customer_stats(overdue_count)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_stats_unpaid ON customer_stats(unpaid_fines)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_stats_unpaid_amount ON customer_stats(unpaid_fine_amount)")
+    triggers = {
+        "customers_stats_ai": "AFTER INSERT ON customers BEGIN "
+                              "INSERT INTO customer_stats (customer_id) VALUES (NEW.id); END",
+        "orders_stats_ai": f"""AFTER INSERT ON orders BEGIN
+            UPDATE customer_stats SET {_order_stats_delta("+", "NEW")},
+                last_rental = CASE WHEN {_billed("NEW")} AND (last_rental IS NULL OR NEW.start_date > last_rental)
+                                   THEN NEW.start_date ELSE last_rental END
+            WHERE customer_id = NEW.customer_id;
+        END""",
+        "orders_stats_ad": f"""AFTER DELETE ON orders BEGIN
+            UPDATE customer_stats SET {_order_stats_delta("-", "OLD")}, last_rental = {_LAST_RENTAL}
+            WHERE customer_id = OLD.customer_id;
+        END""",
+        "orders_stats_au": f"""AFTER UPDATE OF customer_id, start_date, status, amount ON orders BEGIN
+            UPDATE customer_stats SET {_order_stats_delta("-", "OLD")} WHERE customer_id = OLD.customer_id;
+            UPDATE customer_stats SET {_order_stats_delta("+", "NEW")} WHERE customer_id = NEW.customer_id;
+            UPDATE customer_stats SET last_rental = {_LAST_RENTAL}
+            WHERE customer_id IN (OLD.customer_id, NEW.customer_id);
+        END""",
+        "fines_stats_ai": f"""AFTER INSERT ON fines BEGIN
+            UPDATE customer_stats SET {_fine_stats_delta("+", "NEW")} WHERE customer_id = NEW.customer_id;
+        END""",
+        "fines_stats_ad": f"""AFTER DELETE ON fines BEGIN
+            UPDATE customer_stats SET {_fine_stats_delta("-", "OLD")} WHERE customer_id = OLD.customer_id;
+        END""",
+        "fines_stats_au": f"""AFTER UPDATE OF customer_id, amount, paid ON fines BEGIN
+            UPDATE customer_stats SET {_fine_stats_delta("-", "OLD")} WHERE customer_id = OLD.customer_id;
+            UPDATE customer_stats SET {_fine_stats_delta("+", "NEW")} WHERE customer_id = NEW.customer_id;
+        END""",
+    }
+    for name, body in triggers.items():
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(f"CREATE TRIGGER {name} {body}")
+
+    # 客户表逐行都有汇总行，内连接即可；按姓名等排序时仍从 customers 的索引读，
+    # 按汇总列排序时用 customer_id（customer_stats 的主键）兜底，从 customer_stats 的索引读
+    cur.execute("DROP VIEW IF EXISTS customer_list")
+    cur.execute(f"""
+    CREATE VIEW customer_list AS
+    SELECT c.*, {", ".join("s." + col for col in CUSTOMER_STATS_COLUMNS)}, s.customer_id
+    FROM customers c
+    JOIN customer_stats s ON s.customer_id = c.id""")
+
+
+def _fill_customer_stats(cur):
+    """按现有订单、罚款整体重算汇总表"""
+    cur.execute("DELETE FROM customer_stats")
+    cur.execute(f"""
+    INSERT INTO customer_stats (customer_id, order_count, total_billed, overdue_count,
+                                unpaid_fines, unpaid_fine_amount, last_rental)
+    SELECT c.id,
+           coalesce(o.n, 0), coalesce(o.billed, 0), coalesce(o.overdue, 0),
+           coalesce(f.n, 0), coalesce(f.amount, 0), o.last_rental
+    FROM customers c
+    LEFT JOIN (SELECT customer_id, COUNT(*) AS n, SUM(coalesce(amount, 0)) AS billed,
+                      SUM(status = 'overdue') AS overdue, MAX(start_date) AS last_rental
+               FROM orders WHERE {_billed('orders')} GROUP BY customer_id) o ON o.customer_id = c.id
+    LEFT JOIN (SELECT customer_id, COUNT(*) AS n, SUM(coalesce(amount, 0)) AS amount
+               FROM fines WHERE NOT coalesce(paid, 0) GROUP BY customer_id) f ON f.customer_id = c.id""")
+
+
+# 订单占用区间索引：R*Tree 一维是车辆 id、一维是起止日期，重叠查询和空闲车辆查询都是对数级。
+# 用 rtree_i32，yyyymmdd 整数原样存、没有浮点误差。只收未取消、车辆和日期完整的订单；
+# 起止日期都算占用（[开始, 结束] 闭区间），当天租当天还的订单也占着这一天
+BOOKING_CONFLICT = "booking conflict"
+JSON_IMPORTING = "json_importing"   # meta 里有这一项时（导入旧 JSON 期间）不查重复预订，旧数据里的重叠订单照收
+
 
-    # 罚款表
+def _span_valid(row):
+    return (f"{row}.vehicle_id IS NOT NULL AND typeof({row}.start_date) = 'integer' "
+            f"AND typeof({row}.end_date) = 'integer' AND {row}.start_date <= {row}.end_date "
+            f"AND coalesce({row}.status, '') <> 'cancelled'")
+
+
+def _span_overlap(row):
+    return (f"SELECT 1 FROM order_spans WHERE vehicle_min <= {row}.vehicle_id AND vehicle_max >= {row}.vehicle_id "
+            f"AND start_date <= {row}.end_date AND end_date >= {row}.start_date")
+
+
+def _create_order_spans(cur):
+    """order_spans 由触发器跟着 orders 增删改；
+    BEFORE 触发器在写入前查重叠，新订单、改期、续租、取消后恢复都不能和同一辆车的其它订单重叠"""
+    cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS order_spans "
+                "USING rtree_i32(id, vehicle_min, vehicle_max, start_date, end_date)")
+    insert_span = ("INSERT INTO order_spans SELECT NEW.id, NEW.vehicle_id, NEW.vehicle_id, NEW.start_date, NEW.end_date "
+                   f"WHERE {_span_valid('NEW')};")
+    changed = ("(NEW.vehicle_id IS NOT OLD.vehicle_id OR NEW.start_date IS NOT OLD.start_date "
+               f"OR NEW.end_date IS NOT OLD.end_date OR NOT ({_span_valid('OLD')}))")
+    triggers = {
+        "orders_booking_bi": f"""BEFORE INSERT ON orders
+            WHEN {_span_valid("NEW")} AND NOT EXISTS (SELECT 1 FROM meta WHERE key = '{JSON_IMPORTING}') BEGIN
+            SELECT RAISE(ABORT, '{BOOKING_CONFLICT}') WHERE EXISTS ({_span_overlap("NEW")});
+        END""",
+        # 只在车辆、日期真的变了或从取消恢复时检查：已有的重叠旧数据改备注、改状态不受影响
+        "orders_booking_bu": f"""BEFORE UPDATE OF vehicle_id, start_date, end_date, status ON orders
+            WHEN {_span_valid("NEW")} AND {changed} BEGIN
+            SELECT RAISE(ABORT, '{BOOKING_CONFLICT}') WHERE EXISTS ({_span_overlap("NEW")} AND id <> OLD.id);
+        END""",
+        "orders_spans_ai": f"AFTER INSERT ON orders BEGIN {insert_span} END",
+        "orders_spans_ad": "AFTER DELETE ON orders BEGIN DELETE FROM order_spans WHERE id = OLD.id; END",
+        "orders_spans_au": f"""AFTER UPDATE OF id, vehicle_id, start_date, end_date, status ON orders BEGIN
+            DELETE FROM order_spans WHERE id = OLD.id;
+            {insert_span}
+        END""",
+    }
+    for name, body in triggers.items():
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def _fill_order_spans(cur):
+    """按现有订单整体重建区间索引（已有的重叠订单照样收进来）"""
+    cur.execute("DELETE FROM order_spans")
+    cur.execute("INSERT INTO order_spans SELECT id, vehicle_id, vehicle_id, start_date, end_date "
+                f"FROM orders o WHERE {_span_valid('o')}")
+
+
+# 全文索引：一张 FTS5 表覆盖四类记录，rowid = id * 4 + 类别号（类别号即下标）
+# search_fts 按词做前缀匹配；search_tri 只收车牌、车型、电话、姓名这类短标识，trigram 分词，可匹配任意连续 3 个字以上的片段；
+# 不到 3 个字的词 trigram 查不了，在这些短标识列上逐行找子串
+SEARCH_SOURCES = (
+    ("vehicles", "vehicles", ("plate", "model", "remark"), ("plate", "model")),
+    ("customers", "customers", ("name", "phone", "remark"), ("name", "phone")),
+    ("orders", "order_list", ("customer", "vehicle", "status", "remark"), ("customer", "vehicle")),
+    ("fines", "fine_list", ("vehicle", "customer", "fine_type", "remark"), ("vehicle", "customer")),
+)
+SEARCH_KIND = {entity: k for k, (entity, _, _, _) in enumerate(SEARCH_SOURCES)}
+TRIGRAM_MIN_LEN = 3
+# trigram 分词要 SQLite 3.34+；更老的版本不建 search_tri，所有词都按短词的办法逐行找子串
+TRIGRAM_ENABLED = sqlite3.sqlite_version_info >= (3, 34, 0)
+SEARCH_TABLES = ("search_fts", "search_tri") if TRIGRAM_ENABLED else ("search_fts",)
+
+
+def _search_select(kind, where, table="search_fts"):
+    entity, source, cols, key_cols = SEARCH_SOURCES[kind]
+    body = " || ' ' || ".join(f"coalesce({c}, '')" for c in (cols if table == "search_fts" else key_cols))
+    return f"SELECT id * 4 + {kind}, {body} FROM {source} WHERE {where}"
+
+
+def _index_sql(kind, where):
+    return "".join(f"INSERT INTO {t} (rowid, body) {_search_select(kind, where, t)};\n" for t in SEARCH_TABLES)
+
+
+def _unindex_sql(rowids):
+    return "".join(f"DELETE FROM {t} WHERE rowid {rowids};\n" for t in SEARCH_TABLES)
+
+
+def _create_search_index(cur):
+    """建 search_fts / search_tri 并用触发器同步；改客户姓名/车牌时连带刷新相关订单和罚款"""
     cur.execute("""
-    CREATE TABLE IF NOT EXISTS fines (
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+        body, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+    )""")
+    if TRIGRAM_ENABLED:
+        cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_tri USING fts5(body, tokenize = 'trigram')")
+    else:
+        print(f"⚠️ SQLite {sqlite3.sqlite_version} 不支持 trigram 分词（需要 3.34+），不建子串索引，搜索改为逐行匹配")
+    for kind, (table, _, _, _) in enumerate(SEARCH_SOURCES):
+        cur.execute(f"DROP TRIGGER IF EXISTS {table}_fts_ai")
+        cur.execute(f"DROP TRIGGER IF EXISTS {table}_fts_au")
+        cur.execute(f"DROP TRIGGER IF EXISTS {table}_fts_ad")
+        cur.execute(f"""
+        CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN
+            {_index_sql(kind, "id = NEW.id")}
+        END""")
+        cur.execute(f"""
+        CREATE TRIGGER {table}_fts_au AFTER UPDATE ON {table} BEGIN
+            {_unindex_sql(f"= OLD.id * 4 + {kind}")}
+            {_index_sql(kind, "id = NEW.id")}
+        END""")
+        cur.execute(f"""
+        CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN
+            {_unindex_sql(f"= OLD.id * 4 + {kind}")}
+        END""")
+    for table, column, ref in (("customers", "name", "customer_id"), ("vehicles", "plate", "vehicle_id")):
+        linked = (f"IN (SELECT id * 4 + {SEARCH_KIND['orders']} FROM orders WHERE {ref} = NEW.id "
+                  f"UNION ALL SELECT id * 4 + {SEARCH_KIND['fines']} FROM fines WHERE {ref} = NEW.id)")
+        cur.execute(f"DROP TRIGGER IF EXISTS {table}_fts_refs")
+        cur.execute(f"""
+        CREATE TRIGGER {table}_fts_refs AFTER UPDATE OF {column} ON {table} BEGIN
+            {_unindex_sql(linked)}
+            {_index_sql(SEARCH_KIND["orders"], f"{ref} = NEW.id")}
+            {_index_sql(SEARCH_KIND["fines"], f"{ref} = NEW.id")}
+        END""")
+
+
+def _fill_search_index(cur, tables=SEARCH_TABLES):
+    for t in tables:
+        if t not in SEARCH_TABLES:
+            continue    # 当前 SQLite 不支持 trigram
+        cur.execute(f"DELETE FROM {t}")
+        for kind in range(len(SEARCH_SOURCES)):
+            cur.execute(f"INSERT INTO {t} (rowid, body) {_search_select(kind, '1', t)}")
+
+
+def rebuild_search_index():
+    """按当前数据重建全文索引"""
+    conn = get_conn()
+    _fill_search_index(conn.cursor())
+    conn.commit()
+
+
+def _sql_date(col):
+    return (f"CASE WHEN {col} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]' "
+            f"THEN CAST(REPLACE({col}, '-', '') AS INTEGER) ELSE NULLIF({col}, '') END")
+
+
+def _sql_num(col):
+    # 交给列的 INTEGER/REAL 亲和去转换，非数字文本会原样保留
+    return f"NULLIF(TRIM({col}), '')"
+
+
+def _rebuild_table(cur, table, ddl, columns, exprs):
+    """按 SQLite 推荐的方式改表：建新表 -> 拷数据 -> 删旧表 -> 改名"""
+    cur.execute(ddl.format(table=f"{table}_new"))
+    cur.execute(f"INSERT INTO {table}_new (id, {', '.join(columns)}) "
+                f"SELECT id, {', '.join(exprs)} FROM {table}")
+    cur.execute(f"DROP TABLE {table}")
+    cur.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+def _migrate_v1(cur):
+    """v1：数值列改为 INTEGER/REAL，日期改存 yyyymmdd 整数"""
+    _rebuild_table(cur, "vehicles", """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        plate TEXT NOT NULL UNIQUE,
+        model TEXT, year INTEGER, insurance INTEGER,
+        mileage INTEGER, monthly_price REAL,
+        deposit REAL, remark TEXT
+    )""", ("plate", "model", "year", "insurance", "mileage", "monthly_price", "deposit", "remark"),
+        ["plate", "model", _sql_num("year"), _sql_date("insurance"), _sql_num("mileage"),
+         _sql_num("monthly_price"), _sql_num("deposit"), "remark"])
+
+    _rebuild_table(cur, "orders", """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer TEXT, vehicle TEXT,
+        start_date INTEGER, end_date INTEGER,
+        status TEXT, amount REAL, remark TEXT
+    )""", ("customer", "vehicle", "start_date", "end_date", "status", "amount", "remark"),
+        ["customer", "vehicle", _sql_date("start_date"), _sql_date("end_date"),
+         "status", _sql_num("amount"), "remark"])
+
+    _rebuild_table(cur, "fines", """
+    CREATE TABLE {table} (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         vehicle TEXT, customer TEXT,
-        fine_type TEXT, amount TEXT,
-        fine_date TEXT, paid INTEGER,
+        fine_type TEXT, amount REAL,
+        fine_date INTEGER, paid INTEGER,
         remark TEXT
-    )""")
+    )""", ("vehicle", "customer", "fine_type", "amount", "fine_date", "paid", "remark"),
+        ["vehicle", "customer", "fine_type", _sql_num("amount"), _sql_date("fine_date"),
+         "paid", "remark"])
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_insurance ON vehicles(insurance)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_end ON orders(status, end_date)")
+
+
+def _migrate_v2(cur):
+    """v2：订单/罚款改用 customer_id / vehicle_id 外键，不再存姓名和车牌文本"""
+    # 历史数据里找不到对应客户/车辆的，先补建一条，保证外键都能对上
+    for table in ("orders", "fines"):
+        cur.execute(f"""
+        INSERT INTO customers (name, is_corporate, status, remark)
+        SELECT DISTINCT customer, 0, 'normal', '迁移时自动补建' FROM {table}
+        WHERE COALESCE(customer, '') != ''
+          AND customer NOT IN (SELECT name FROM customers WHERE name IS NOT NULL)""")
+        cur.execute(f"""
+        INSERT INTO vehicles (plate, remark)
+        SELECT DISTINCT vehicle, '迁移时自动补建' FROM {table}
+        WHERE COALESCE(vehicle, '') != ''
+          AND vehicle NOT IN (SELECT plate FROM vehicles)""")
+
+    def customer_ref(table):
+        # 同名客户取最早建档的那位
+        return f"(SELECT MIN(c.id) FROM customers c WHERE c.name = {table}.customer)"
+
+    def vehicle_ref(table):
+        return f"(SELECT v.id FROM vehicles v WHERE v.plate = {table}.vehicle)"
+
+    _rebuild_table(cur, "orders", _ORDERS_DDL, ORDER_COLUMNS,
+                   [customer_ref("orders"), vehicle_ref("orders"), "start_date", "end_date", "status", "amount", "remark"])
+    _rebuild_table(cur, "fines", _FINES_DDL, FINE_COLUMNS,
+                   [vehicle_ref("fines"), customer_ref("fines"), "fine_type", "amount", "fine_date", "paid", "remark"])
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_end ON orders(status, end_date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_vehicle ON orders(vehicle_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_customer ON fines(customer_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fines_vehicle ON fines(vehicle_id)")
+    _create_views(cur)
+
+
+def _migrate_v3(cur):
+    """v3：补上分页排序用的索引"""
+    _create_sort_indexes(cur)
+
+
+def _migrate_v4(cur):
+    """v4：加 meta 表；老库每次启动都跑过 JSON 导入，直接记为已导入"""
+    _create_meta(cur)
+    cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', '1')")
+
+
+def _migrate_v5(cur):
+    """v5：全文搜索索引，并把已有数据灌进去"""
+    _create_search_index(cur)
+    _fill_search_index(cur, ("search_fts",))
+
+
+def _migrate_v6(cur):
+    """v6：多列排序后，押金、是否企业、罚款类型也能排序，补上索引"""
+    _create_sort_indexes(cur)
+
+
+def _migrate_v7(cur):
+    """v7：车牌/车型/电话/姓名的 trigram 子串索引（触发器一并重建）"""
+    _create_search_index(cur)
+    _fill_search_index(cur, ("search_tri",))
 
-    conn.commit()
-    conn.close()
 
+def _migrate_v8(cur):
+    """v8：客户汇总表 customer_stats 和 customer_list 视图，按现有数据算一遍"""
+    _create_customer_stats(cur)
+    _fill_customer_stats(cur)
 
-def migrate_json_to_sqlite():
-    """如果表是空的，且存在 JSON 文件，就导入数据"""
+
+def _migrate_v9(cur):
+    """v9：新记录的 id 改由 AUTOINCREMENT 分配，订单序号从 ORDER_ID_BASE 起"""
+    _seed_order_ids(cur)
+
+
+def _migrate_v10(cur):
+    """v10：订单占用区间索引 order_spans（起止日期都算占用）和防重复预订的触发器"""
+    _create_order_spans(cur)
+    _fill_order_spans(cur)
+
+
+# 版本号 -> 升级到该版本的迁移函数
+_MIGRATIONS = {
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+    4: _migrate_v4,
+    5: _migrate_v5,
+    6: _migrate_v6,
+    7: _migrate_v7,
+    8: _migrate_v8,
+    9: _migrate_v9,
+    10: _migrate_v10,
+}
+
+
+def init_db():
+    """初始化表；老版本的 rental.db 按版本号逐级原地升级"""
     conn = get_conn()
     cur = conn.cursor()
+    version = cur.execute("PRAGMA user_version").fetchone()[0]
+    fresh = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vehicles'").fetchone() is None
+
+    if fresh:
+        _transaction(conn)
+        _create_schema(cur)
+        cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        return
 
-    # 检查是否已有数据
-    cur.execute("SELECT COUNT(*) FROM customers")
-    has_customer = cur.fetchone()[0]
-    if has_customer == 0 and os.path.exists("customer_data.json"):
-        with open("customer_data.json", "r", encoding="utf-8") as f:
-            customers = json.load(f)
-        for c in customers:
-            cur.execute("INSERT INTO customers (name, phone, is_corporate, status, remark) VALUES (?, ?, ?, ?, ?)",
-                        (c["name"], c["phone"], int(c["is_corporate"]), c["status"], c["remark"]))
-        print(f"✅ 导入 {len(customers)} 条客户数据")
-
-    cur.execute("SELECT COUNT(*) FROM vehicles")
-    has_vehicle = cur.fetchone()[0]
-    if has_vehicle == 0 and os.path.exists("vehicle_data.json"):
-        with open("vehicle_data.json", "r", encoding="utf-8") as f:
-            vehicles = json.load(f)
-        for v in vehicles:
-            cur.execute("INSERT INTO vehicles (plate, model, year, insurance, mileage, monthly_price, deposit, remark) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                        (v["plate"], v["model"], v["year"], v["insurance"], v["mileage"], v["monthly_price"], v["deposit"], v["remark"]))
-        print(f"✅ 导入 {len(vehicles)} 条车辆数据")
-
-    cur.execute("SELECT COUNT(*) FROM orders")
-    has_order = cur.fetchone()[0]
-    if has_order == 0 and os.path.exists("order_data.json"):
-        with open("order_data.json", "r", encoding="utf-8") as f:
-            orders = json.load(f)
-        for o in orders:
-            cur.execute("INSERT INTO orders (customer, vehicle, start_date, end_date, status, amount, remark) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (o["customer"], o["vehicle"], o["start_date"], o["end_date"], o["status"], o["amount"], o["remark"]))
-        print(f"✅ 导入 {len(orders)} 条订单数据")
-
-    cur.execute("SELECT COUNT(*) FROM fines")
-    has_fine = cur.fetchone()[0]
-    if has_fine == 0 and os.path.exists("fine_data.json"):
-        with open("fine_data.json", "r", encoding="utf-8") as f:
-            fines = json.load(f)
-        for fdata in fines:
-            cur.execute("INSERT INTO fines (vehicle, customer, fine_type, amount, fine_date, paid, remark) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                        (fdata["vehicle"], fdata["customer"], fdata["fine_type"], fdata["amount"], fdata["fine_date"], int(fdata["paid"]), fdata["remark"]))
-        print(f"✅ 导入 {len(fines)} 条罚款数据")
+    if version >= SCHEMA_VERSION:
+        return _sync_trigram(conn)
+    # 重建表时不能触发外键动作；foreign_keys 只能在事务外切换
+    cur.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            _transaction(conn)
+            try:
+                _MIGRATIONS[target](cur)
+                if cur.execute("PRAGMA foreign_key_check").fetchone():
+                    raise sqlite3.IntegrityError(f"升级到版本 {target} 后外键校验失败")
+                cur.execute(f"PRAGMA user_version = {target}")
+            except Exception:
+                conn.rollback()
+                raise
+            conn.commit()
+            print(f"✅ 数据库已升级到版本 {target}")
+    finally:
+        cur.execute("PRAGMA foreign_keys = ON")
+    _sync_trigram(conn)
 
+
+def _sync_trigram(conn):
+    """库是在另一个 SQLite 版本下建的：现在支持 trigram 就补建 search_tri，不支持就把触发器换成不写它的版本"""
+    cur = conn.cursor()
+    has_table = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_tri'").fetchone()
+    writes = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%search_tri%'").fetchone()
+    if (TRIGRAM_ENABLED and has_table and writes) or (not TRIGRAM_ENABLED and not writes):
+        return
+    _transaction(conn)
+    _create_search_index(cur)
+    _fill_search_index(cur, ("search_tri",))
     conn.commit()
-    conn.close()
 
 
-def load_all_data():
-    """从数据库加载到全局 list"""
-    global vehicle_data, customer_data, order_data, fine_data
+def _resolve_refs(cur, row, cache):
+    """旧 JSON 里订单/罚款存的是姓名和车牌，换成外键 id；库里没有的就补建一条"""
+    name, plate = row.get("customer"), row.get("vehicle")
+    if name and ("c", name) not in cache:
+        r = cur.execute("SELECT MIN(id) FROM customers WHERE name = ?", (name,)).fetchone()
+        cache[("c", name)] = r[0] if r[0] is not None else cur.execute(
+            "INSERT INTO customers (name, is_corporate, status, remark) VALUES (?, 0, 'normal', '迁移时自动补建')",
+            (name,)).lastrowid
+    if plate and ("v", plate) not in cache:
+        r = cur.execute("SELECT id FROM vehicles WHERE plate = ?", (plate,)).fetchone()
+        cache[("v", plate)] = r[0] if r else cur.execute(
+            "INSERT INTO vehicles (plate, remark) VALUES (?, '迁移时自动补建')", (plate,)).lastrowid
+    row["customer_id"] = cache.get(("c", name))
+    row["vehicle_id"] = cache.get(("v", plate))
+    return row
+
+
+def get_meta(key, default=None):
+    r = get_conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return r[0] if r else default
+
+
+def set_meta(key, value, commit=True):
     conn = get_conn()
-    cur = conn.cursor()
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+    if commit:
+        conn.commit()
 
-    cur.execute("SELECT * FROM vehicles")
-    rows = cur.fetchall()
-    vehicle_data[:] = [dict(id=r[0], plate=r[1], model=r[2], year=r[3], insurance=r[4],
-                            mileage=r[5], monthly_price=r[6], deposit=r[7], remark=r[8])
-                       for r in rows]
 
-    cur.execute("SELECT * FROM customers")
-    rows = cur.fetchall()
-    customer_data[:] = [dict(id=r[0], name=r[1], phone=r[2], is_corporate=bool(r[3]),
-                             status=r[4], remark=r[5]) for r in rows]
+# 旧版 JSON 数据文件：(表, 文件, 列, 是否需要把姓名/车牌换成外键 id)
+JSON_SOURCES = [
+    ("customers", "customer_data.json", CUSTOMER_COLUMNS, False),
+    ("vehicles", "vehicle_data.json", VEHICLE_COLUMNS, False),
+    ("orders", "order_data.json", ORDER_COLUMNS, True),
+    ("fines", "fine_data.json", FINE_COLUMNS, True),
+]
+JSON_LABELS = {"customers": "客户", "vehicles": "车辆", "orders": "订单", "fines": "罚款"}
+JSON_BATCH_SIZE = 2000
+JSON_CHUNK_SIZE = 1 << 20
 
-    cur.execute("SELECT * FROM orders")
-    rows = cur.fetchall()
-    order_data[:] = [dict(id=r[0], customer=r[1], vehicle=r[2], start_date=r[3],
-                          end_date=r[4], status=r[5], amount=r[6], remark=r[7])
-                     for r in rows]
 
-    cur.execute("SELECT * FROM fines")
-    rows = cur.fetchall()
-    fine_data[:] = [dict(id=r[0], vehicle=r[1], customer=r[2], fine_type=r[3],
-                         amount=r[4], fine_date=r[5], paid=bool(r[6]), remark=r[7])
-                    for r in rows]
+def iter_json_array(path, chunk_size=JSON_CHUNK_SIZE):
+    """逐条解析顶层为数组的 JSON 文件，每次只读一块；产出 (记录, 已读字节数)"""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buf, pos, read, eof, opened = "", 0, 0, False, False
+    with open(path, "rb") as f:
+        while True:
+            # 跳过空白、开头的 '[' 和记录之间的 ','，缓冲区用完就再读一块
+            while True:
+                while pos < len(buf) and (buf[pos] in " \t\r\n," or (buf[pos] == "[" and not opened)):
+                    opened = opened or buf[pos] == "["
+                    pos += 1
+                if pos < len(buf) or eof:
+                    break
+                chunk = f.read(chunk_size)
+                read += len(chunk)
+                eof = not chunk
+                buf, pos = text.decode(chunk, final=eof), 0
+            if pos >= len(buf) or buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # 记录被块边界截断，接上下一块再解析
+                chunk = f.read(chunk_size)
+                read += len(chunk)
+                eof = not chunk
+                buf, pos = buf[pos:] + text.decode(chunk, final=eof), 0
+                continue
+            pos = end
+            yield obj, read
 
-    conn.close()
 
+def _print_progress(table, done, fraction):
+    print(f"   导入{JSON_LABELS[table]}数据 {done} 条（{fraction:.0%}）")
 
-def save_all_data():
-    """把全局 list 写回数据库（粗暴方式：先删再插）"""
+
+def _import_json_file(table, path, columns, resolve, batch_size, progress):
+    """分批导入一个 JSON 文件；每批和进度记录在同一个事务里提交，中断后从上次提交处继续"""
+    key = f"json_import_{table}"
+    state = get_meta(key)
+    if state == "done":
+        return
+    if state is None and has_rows(table):
+        return  # 表里已有数据，不覆盖
+    skip = int(state or 0)
     conn = get_conn()
     cur = conn.cursor()
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    size = os.path.getsize(path) or 1
+    ref_cache, batch, done = {}, [], skip
+
+    def flush():
+        cur.executemany(sql, batch)
+        set_meta(key, done, commit=False)
+        conn.commit()
+        batch.clear()
+        if progress:
+            progress(table, done, min(read / size, 1.0))
 
-    # vehicles
-    cur.execute("DELETE FROM vehicles")
-    for v in vehicle_data:
-        cur.execute("INSERT INTO vehicles (id, plate, model, year, insurance, mileage, monthly_price, deposit, remark) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    (v["id"], v["plate"], v["model"], v["year"], v["insurance"], v["mileage"], v["monthly_price"], v["deposit"], v["remark"]))
-
-    # customers
-    cur.execute("DELETE FROM customers")
-    for c in customer_data:
-        cur.execute("INSERT INTO customers (id, name, phone, is_corporate, status, remark) VALUES (?, ?, ?, ?, ?, ?)",
-                    (c["id"], c["name"], c["phone"], int(c["is_corporate"]), c["status"], c["remark"]))
-
-    # orders
-    cur.execute("DELETE FROM orders")
-    for o in order_data:
-        cur.execute("INSERT INTO orders (id, customer, vehicle, start_date, end_date, status, amount, remark) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                    (o["id"], o["customer"], o["vehicle"], o["start_date"], o["end_date"], o["status"], o["amount"], o["remark"]))
-
-    # fines
-    cur.execute("DELETE FROM fines")
-    for f in fine_data:
-        cur.execute("INSERT INTO fines (id, vehicle, customer, fine_type, amount, fine_date, paid, remark) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                    (f["id"], f["vehicle"], f["customer"], f["fine_type"], f["amount"], f["fine_date"], int(f["paid"]), f["remark"]))
+    read = 0
+    for i, (row, read) in enumerate(iter_json_array(path)):
+        if i < skip:
+            continue  # 上次已经提交过的记录
+        if resolve:
+            _resolve_refs(cur, row, ref_cache)
+        batch.append(_params(columns, _coerce(columns, row)))
+        done += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    set_meta(key, "done")
+    print(f"✅ 导入 {done} 条{JSON_LABELS[table]}数据")
 
+
+def migrate_json_to_sqlite(batch_size=JSON_BATCH_SIZE, progress=_print_progress):
+    """首次启动时把旧 JSON 文件流式导入空表，可断点续导；全部完成后在 meta 里记一笔，以后直接跳过"""
+    if get_meta("json_migrated"):
+        return
+    set_meta(JSON_IMPORTING, 1)
+    for table, path, columns, resolve in JSON_SOURCES:
+        if os.path.exists(path):
+            _import_json_file(table, path, columns, resolve, batch_size, progress)
+    conn = get_conn()
+    set_meta("json_migrated", 1, commit=False)
+    conn.execute("DELETE FROM meta WHERE key = ?", (JSON_IMPORTING,))
     conn.commit()
-    conn.close()
 
 
-# 初始化数据库 & JSON迁移 & 初次加载
-init_db()
-migrate_json_to_sqlite()
-load_all_data()
\ No newline at end of file
+def startup():
+    """程序启动时调用一次：检查/升级表结构，首次运行时导入旧 JSON。重复调用直接返回"""
+    global _started
+    if _started:
+        return
+    init_db()
+    migrate_json_to_sqlite()
+    _started = True
+
+
+def _row_to_dict(columns, r):
+    row = {"id": r[0]}
+    for c, val in zip(columns, r[1:]):
+        if c in _BOOL_COLUMNS:
+            row[c] = bool(val)
+        elif c in _DATE_COLUMNS:
+            row[c] = int_to_date(val)
+        elif val is None and c not in _TYPED_COLUMNS:
+            row[c] = ""  # 文本列的 NULL 对界面统一成空串
+        else:
+            row[c] = val
+    return row
+
+
+# ========== 分页查询 ==========
+# 实体 -> (读取用的表/视图, 列, 搜索匹配的列)
+ENTITIES = {
+    "vehicles": ("vehicles", VEHICLE_COLUMNS),
+    "customers": ("customer_list", CUSTOMER_LIST_COLUMNS),
+    "orders": ("order_list", ORDER_LIST_COLUMNS),
+    "fines": ("fine_list", FINE_LIST_COLUMNS),
+}
+
+
+def _search_terms(search):
+    return [t for t in search.split() if re.search(r"\w", t)]
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def fts_query(search):
+    """把输入框里的文字转成 FTS5 查询：按空格拆词，每个词做前缀匹配，词之间是 AND"""
+    return " ".join(_fts_phrase(t) + "*" for t in _search_terms(search))
+
+
+def _where(entity, search):
+    """搜索条件：每个词都要命中——search_fts 里的词前缀，或车牌/车型/电话/姓名里的任意片段
+    （够 3 个字时查 search_tri，更短的词或没有 search_tri 时逐行 instr，如"小明"找"王小明"、"12"找"DXB12"）"""
+    kind = SEARCH_KIND[entity]
+    key_cols = SEARCH_SOURCES[kind][3]
+    conds, args = [], []
+    for term in _search_terms(search or ""):
+        sub = f"SELECT rowid >> 2 FROM search_fts WHERE search_fts MATCH ? AND rowid & 3 = {kind}"
+        args.append(_fts_phrase(term) + "*")
+        if TRIGRAM_ENABLED and len(term) >= TRIGRAM_MIN_LEN:
+            sub += f" UNION SELECT rowid >> 2 FROM search_tri WHERE search_tri MATCH ? AND rowid & 3 = {kind}"
+            args.append(_fts_phrase(term))
+            conds.append(f"id IN ({sub})")
+        else:
+            conds.append(f"(id IN ({sub}) OR "
+                         + " OR ".join(f"instr(lower({c}), lower(?)) > 0" for c in key_cols) + ")")
+            args += [term] * len(key_cols)
+    return (" WHERE " + " AND ".join(conds), args) if conds else ("", [])
+
+
+def search_all(search, limit=50):
+    """全局搜索：四类记录一起按相关度（bm25）排序，返回 [(entity, id, 命中摘要)]"""
+    query = fts_query(search)
+    if not query:
+        return []
+    rows = get_conn().execute(
+        "SELECT rowid, snippet(search_fts, 0, '[', ']', '…', 10) FROM search_fts "
+        "WHERE search_fts MATCH ? ORDER BY rank LIMIT ?", (query, limit)).fetchall()
+    return [(SEARCH_SOURCES[rowid & 3][0], rowid >> 2, snip) for rowid, snip in rows]
+
+
+# 车牌、电话已经规范化，状态是代码值：按 BINARY 排，正好用上它们的 UNIQUE/普通索引；其余文本列按 NOCASE 排
+_BINARY_SORT_COLUMNS = {"plate", "phone", "status"}
+# 订单/罚款视图里连接来的姓名、车牌没有索引可用，每次翻页都要整表重排，不提供排序
+_UNSORTABLE_COLUMNS = {"customer", "vehicle"}
+
+
+def _sort_keys(entity, sort=()):
+    """sort: [(列, 是否降序)]，排在前面的优先。
+    返回排序键 [(SQL 表达式, 是否降序, 结果行中的下标)]，最后总是用 id 兜底保证顺序唯一"""
+    columns = ENTITIES[entity][1]
+    keys = []
+    for column, desc in sort:
+        if column == "id":
+            keys.append(("id", desc, 0))
+            return keys     # id 唯一，后面的键不起作用
+        if column not in columns or column in _UNSORTABLE_COLUMNS:
+            raise ValueError(f"不能排序的列: {column}")
+        collate = "" if column in _TYPED_COLUMNS or column in _BINARY_SORT_COLUMNS else " COLLATE NOCASE"
+        keys.append((f"{column}{collate}", desc, columns.index(column) + 1))
+    # 按汇总列排时用 customer_stats 自己的 customer_id 兜底（值和 id 相同），才能顺着它的索引读
+    tie = "customer_id" if entity == "customers" and keys and sort[0][0] in CUSTOMER_STATS_COLUMNS else "id"
+    # 方向和第一个键一致，单列排序时才能直接顺着索引读
+    keys.append((tie, keys[0][1] if keys else False, 0))
+    return keys
+
+
+def _order_sql(keys):
+    return " ORDER BY " + ", ".join(f"{expr} {'DESC' if desc else 'ASC'}" for expr, desc, _ in keys)
+
+
+def _order_clause(entity, sort=()):
+    return _order_sql(_sort_keys(entity, sort))
+
+
+def count_rows(entity, search="", conn=None):
+    """符合搜索条件的总条数"""
+    source = ENTITIES[entity][0]
+    where, args = _where(entity, search)
+    return (conn or get_conn()).execute(f"SELECT COUNT(*) FROM {source}{where}", args).fetchone()[0]
+
+
+def iter_rows(entity, search="", sort=(), conn=None, chunk_size=1000):
+    """按与分页相同的条件读出全部结果（导出用），每次从游标取 chunk_size 行"""
+    source, columns = ENTITIES[entity]
+    where, args = _where(entity, search)
+    cur = (conn or get_conn()).execute(
+        f"SELECT id, {', '.join(columns)} FROM {source}{where}{_order_clause(entity, sort)}", args)
+    while True:
+        chunk = cur.fetchmany(chunk_size)
+        if not chunk:
+            return
+        for r in chunk:
+            yield _row_to_dict(columns, r)
+
+
+# ========== 键集分页 ==========
+# 翻页不用 OFFSET，而是记住当前页首/末行的排序键，从那里直接在索引上定位往后读。
+# 翻得再深也只是几次索引查找，别人同时插入的订单也不会让行在页与页之间错位。
+
+def _seek_segments(keys, values, inclusive=False):
+    """把"排在 values 这一行之后"拆成按先后顺序排列的若干段，每段都是"前缀相等 + 一个范围"，都能走索引。
+    （行值比较或 OR 写法遇到 COLLATE/NULL 时 SQLite 会退化成全索引扫描）
+    NULL 在升序里排最前、降序里排最后；inclusive 时包含该行本身。"""
+    segments = []
+    for i in range(len(keys) - 1, -1, -1):
+        expr, desc, _ = keys[i]
+        prefix, prefix_args = [], []
+        for (prev_expr, _, _), v in zip(keys[:i], values[:i]):
+            if v is None:
+                prefix.append(f"{prev_expr} IS NULL")
+            else:
+                prefix.append(f"{prev_expr} = ?"); prefix_args.append(v)
+        v = values[i]
+        if i == len(keys) - 1:
+            # 最后一个键是 id，不会为 NULL
+            ranges = [(f"{expr} {'<' if desc else '>'}{'=' if inclusive else ''} ?", [v])]
+        elif v is None:
+            ranges = [] if desc else [(f"{expr} IS NOT NULL", [])]
+        elif desc:
+            ranges = [(f"{expr} < ?", [v]), (f"{expr} IS NULL", [])]
+        else:
+            ranges = [(f"{expr} > ?", [v])]
+        for clause, args in ranges:
+            segments.append((" AND ".join(prefix + [clause]), prefix_args + args))
+    return segments
+
+
+class KeysetPager:
+    """一个列表视图的分页状态：查询条件、当前页已读入的行，以及访问过的各页首行排序键（锚点）。
+    每页最多 page_size 行，先读 fetch_size 行，其余由 more() 随滚动按需读入。
+    conn 为空时用共享连接；后台线程要传入自己的连接"""
+
+    def __init__(self, entity, page_size=10, fetch_size=None, conn=None):
+        self.entity = entity
+        self.conn = conn
+        self.page_size = page_size
+        self.fetch_size = min(fetch_size or page_size, page_size)
+        self.search = ""
+        self.sort = []      # [(列, 是否降序)]，每个视图各自一份
+        self.page = 1
+        self.total = 0
+        self.rows = []
+        self._keys = []
+        self._anchors = {}
+
+    @property
+    def total_pages(self):
+        return max(1, (self.total + self.page_size - 1) // self.page_size)
+
+    def page_len(self, page=None):
+        """某一页应有的行数（末页可能不满）"""
+        page = self.page if page is None else page
+        return max(0, min(self.page_size, self.total - (page - 1) * self.page_size))
+
+    @property
+    def has_more(self):
+        """当前页还有没读入的行"""
+        return bool(self.rows) and len(self.rows) < self.page_len()
+
+    def set_query(self, search=None, sort=None):
+        """修改搜索/排序条件后回到第一页；旧锚点全部失效"""
+        if search is not None:
+            self.search = search
+        if sort is not None:
+            self.sort = list(sort)
+        self._anchors.clear()
+        self.first()
+
+    def snapshot(self):
+        """当前查询条件和当前页的一份拷贝（不带连接），可以交给别的线程"""
+        copy = KeysetPager(self.entity, self.page_size, self.fetch_size)
+        copy.adopt(self)
+        return copy
+
+    def adopt(self, other):
+        """换成另一个分页器（如后台线程查好的）的查询条件和当前页"""
+        self.search, self.sort = other.search, list(other.sort)
+        self.page, self.total = other.page, other.total
+        self.rows, self._keys, self._anchors = list(other.rows), list(other._keys), dict(other._anchors)
+
+    def _db(self):
+        return self.conn or get_conn()
+
+    def toggle_sort(self, column, append=False):
+        """点表头：单击只按这一列排，再点切换升降序；append（Shift+单击）时把这一列加到已有排序键后面，
+        已在其中则只切换它的方向"""
+        sort = list(self.sort)
+        pos = next((i for i, (c, _) in enumerate(sort) if c == column), None)
+        if append and pos is not None:
+            sort[pos] = (column, not sort[pos][1])
+        elif append:
+            sort.append((column, False))
+        elif pos is not None and len(sort) == 1:
+            sort = [(column, not sort[0][1])]
+        else:
+            sort = [(column, False)]
+        self.set_query(sort=sort)
+
+    def _count(self):
+        self.total = count_rows(self.entity, self.search, self._db())
+
+    def _fetch(self, seek=None, inclusive=False, reverse=False, offset=0, limit=None):
+        source, columns = ENTITIES[self.entity]
+        keys = _sort_keys(self.entity, self.sort)
+        if reverse:
+            keys = [(expr, not desc, idx) for expr, desc, idx in keys]
+        where, args = _where(self.entity, self.search)
+        segments = [(None, [])] if seek is None else _seek_segments(keys, seek, inclusive)
+        limit = self.page_size if limit is None else limit
+        conn = self._db()
+        raw = []
+        for clause, seg_args in segments:
+            need = limit - len(raw)
+            if need <= 0:
+                break
+            seg_where, seg_all = where, args + seg_args
+            if clause:
+                seg_where = f"{where} AND {clause}" if where else f" WHERE {clause}"
+            if offset:
+                # 跨段跳过：先数一下这一段够不够跳（最多数到 offset）
+                skipped = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {source}{seg_where} LIMIT ?)",
+                                       seg_all + [offset]).fetchone()[0]
+                if skipped < offset:
+                    offset -= skipped
+                    continue
+            raw += conn.execute(
+                f"SELECT id, {', '.join(columns)} FROM {source}{seg_where}{_order_sql(keys)} LIMIT ? OFFSET ?",
+                seg_all + [need, offset]).fetchall()
+            offset = 0
+        if reverse:
+            raw.reverse()
+        return raw, keys
+
+    def _show(self, page, raw, keys):
+        columns = ENTITIES[self.entity][1]
+        self.page = page
+        self.rows = [_row_to_dict(columns, r) for r in raw]
+        self._keys = [tuple(r[idx] for _, _, idx in keys) for r in raw]
+        if self._keys:
+            self._anchors[page] = self._keys[0]
+
+    def _chunk(self, page, loaded=0):
+        return min(max(self.fetch_size, loaded), self.page_len(page))
+
+    def more(self):
+        """读入当前页的下一批行，返回新读入的行"""
+        if not self.has_more:
+            return []
+        raw, keys = self._fetch(seek=self._keys[-1], limit=min(self.fetch_size, self.page_len() - len(self.rows)))
+        columns = ENTITIES[self.entity][1]
+        added = [_row_to_dict(columns, r) for r in raw]
+        self.rows += added
+        self._keys += [tuple(r[idx] for _, _, idx in keys) for r in raw]
+        return added
+
+    def first(self, loaded=0):
+        self._count()
+        self._show(1, *self._fetch(limit=self._chunk(1, loaded)))
+
+    def last(self):
+        """末页：倒序跳过末页后半部分，读出末页开头的一批，不经过前面的任何一页"""
+        self._count()
+        pages = self.total_pages
+        n, chunk = self.page_len(pages), self._chunk(pages)
+        self._show(pages, *self._fetch(reverse=True, offset=n - chunk, limit=chunk))
+
+    def next(self):
+        if self.page >= self.total_pages or not self._keys:
+            return
+        # 本页还没读入的行直接跳过
+        raw, keys = self._fetch(seek=self._keys[-1], offset=self.page_len() - len(self.rows),
+                                limit=self._chunk(self.page + 1))
+        if raw:
+            self._show(self.page + 1, raw, keys)
+
+    def prev(self):
+        if self.page <= 1 or not self._keys:
+            return
+        chunk = self._chunk(self.page - 1)
+        raw, keys = self._fetch(seek=self._keys[0], reverse=True, offset=self.page_size - chunk, limit=chunk)
+        if not raw:
+            # 前面的行被删掉了，已经不够一页
+            self.first()
+        else:
+            self._show(self.page - 1, raw, keys)
+
+    def goto(self, page, loaded=0):
+        """跳到指定页：从最近的已知锚点（或表尾）出发，只跳过两者之间的行"""
+        self._count()
+        page = max(1, min(page, self.total_pages))
+        if page == 1:
+            return self.first(loaded)
+        if page == self.total_pages and not loaded:
+            return self.last()
+        chunk = self._chunk(page, loaded)
+        # 候选起点：表头、已访问过的锚点、表尾
+        best = ((page - 1) * self.page_size, None, False)
+        for p, key in self._anchors.items():
+            if p <= page and (page - p) * self.page_size < best[0]:
+                best = ((page - p) * self.page_size, key, False)
+        from_end = self.total - (page - 1) * self.page_size - chunk
+        if from_end < best[0]:
+            best = (from_end, None, True)
+        offset, anchor, reverse = best
+        self._show(page, *self._fetch(seek=anchor, inclusive=anchor is not None, reverse=reverse,
+                                      offset=offset, limit=chunk))
+
+    def locate(self, row_id):
+        """翻到 row_id 所在的页并读到它为止：按它的排序键数出排在前面的行数，再用 goto 跳过去。
+        返回它在 rows 中的下标；不符合当前搜索条件（或已被删除）时返回 -1"""
+        source, columns = ENTITIES[self.entity]
+        keys = _sort_keys(self.entity, self.sort)
+        where, args = _where(self.entity, self.search)
+        conn = self._db()
+        own = f"{where} AND id = ?" if where else " WHERE id = ?"
+        r = conn.execute(f"SELECT id, {', '.join(columns)} FROM {source}{own}", args + [row_id]).fetchone()
+        if r is None:
+            return -1
+        # 排在它前面的行 = 反向排序时排在它后面的行
+        reverse = [(expr, not desc, idx) for expr, desc, idx in keys]
+        before = 0
+        for clause, seg_args in _seek_segments(reverse, tuple(r[idx] for _, _, idx in keys)):
+            seg_where = f"{where} AND {clause}" if where else f" WHERE {clause}"
+            before += conn.execute(f"SELECT COUNT(*) FROM {source}{seg_where}", args + seg_args).fetchone()[0]
+        self.goto(before // self.page_size + 1, loaded=before % self.page_size + 1)
+        return next((i for i, row in enumerate(self.rows) if row["id"] == row_id), -1)
+
+    def reload(self):
+        """数据改动后刷新当前页：从本页首行的排序键重新读，不受前面插入/删除的影响；已读入的行数保持不变"""
+        loaded = len(self.rows)
+        self._count()
+        if self.page <= 1:
+            return self.first(loaded)
+        if self.page > self.total_pages:
+            return self.goto(self.total_pages, loaded)
+        anchor = self._anchors.get(self.page)
+        if anchor is None:
+            return self.goto(self.page, loaded)
+        raw, keys = self._fetch(seek=anchor, inclusive=True, limit=self._chunk(self.page, loaded))
+        if not raw:
+            return self.goto(self.total_pages, loaded)
+        self._show(self.page, raw, keys)
+
+
+def get_row(entity, row_id):
+    """按主键取一行，不存在返回 None"""
+    source, columns = ENTITIES[entity]
+    r = get_conn().execute(f"SELECT id, {', '.join(columns)} FROM {source} WHERE id = ?", (row_id,)).fetchone()
+    return _row_to_dict(columns, r) if r else None
+
+
+def get_vehicle(vid):
+    return get_row("vehicles", vid)
+
+def get_customer(cid):
+    return get_row("customers", cid)
+
+def get_order(oid):
+    return get_row("orders", oid)
+
+def get_fine(fid):
+    return get_row("fines", fid)
+
+
+def has_rows(table):
+    return get_conn().execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+
+
+def customer_choices():
+    """下拉框用：[(id, 姓名)]"""
+    return get_conn().execute("SELECT id, name FROM customers ORDER BY name COLLATE NOCASE, id").fetchall()
+
+
+def vehicle_choices():
+    """下拉框用：[(id, 车牌)]"""
+    return get_conn().execute("SELECT id, plate FROM vehicles ORDER BY plate, id").fetchall()
+
+
+# ========== 关联查询（走外键索引） ==========
+
+def customer_stats(customer_id):
+    """某客户的汇总数据（直接读 customer_stats，不扫订单）"""
+    r = get_conn().execute(
+        f"SELECT customer_id, {', '.join(CUSTOMER_STATS_COLUMNS)} FROM customer_stats WHERE customer_id = ?",
+        (customer_id,)).fetchone()
+    return _row_to_dict(CUSTOMER_STATS_COLUMNS, r) if r else None
+
+
+def orders_for_customer(customer_id):
+    """某客户的全部订单，按起始日期排列"""
+    rows = get_conn().execute(
+        f"SELECT id, {', '.join(ORDER_LIST_COLUMNS)} FROM order_list WHERE customer_id = ? ORDER BY start_date, id",
+        (customer_id,))
+    return [_row_to_dict(ORDER_LIST_COLUMNS, r) for r in rows]
+
+
+def booking_conflicts(vehicle_id, start, end, exclude_id=None, conn=None):
+    """该车在 [start, end] 内已有的未取消订单 id（查 order_spans，不扫订单）"""
+    rows = (conn or get_conn()).execute(
+        "SELECT id FROM order_spans WHERE vehicle_min <= ?1 AND vehicle_max >= ?1 "
+        "AND start_date <= ?3 AND end_date >= ?2 AND id IS NOT ?4 ORDER BY id",
+        (vehicle_id, date_to_int(start), date_to_int(end), exclude_id))
+    return [r[0] for r in rows]
+
+
+def free_vehicles(start, end, exclude_id=None):
+    """[start, end] 内没有未取消订单的车辆，下拉框用：[(id, 车牌)]；exclude_id 为正在编辑的订单"""
+    return get_conn().execute(
+        "SELECT id, plate FROM vehicles WHERE id NOT IN ("
+        "  SELECT vehicle_min FROM order_spans WHERE start_date <= ?2 AND end_date >= ?1 AND id IS NOT ?3) "
+        "ORDER BY plate, id", (date_to_int(start), date_to_int(end), exclude_id)).fetchall()
+
+
+def count_dependents(ref_column, ref_id):
+    """删除客户/车辆前统计引用它的订单数和罚款数（有引用就不能删）；ref_column 为 customer_id 或 vehicle_id"""
+    if ref_column not in ("customer_id", "vehicle_id"):
+        raise ValueError(f"未知的外键列: {ref_column}")
+    conn = get_conn()
+    orders = conn.execute(f"SELECT COUNT(*) FROM orders WHERE {ref_column} = ?", (ref_id,)).fetchone()[0]
+    fines = conn.execute(f"SELECT COUNT(*) FROM fines WHERE {ref_column} = ?", (ref_id,)).fetchone()[0]
+    return orders, fines
+
+
+# ========== 范围 & 汇总查询 ==========
+
+def insurance_expiry(today, soon_until, limit=10):
+    """保险到期概况 (已过期数, 已过期车牌, 即将到期数, 即将到期车牌)，车牌按到期日排序、最多 limit 个。
+    早于 today 为已过期，today ~ soon_until（含）为即将到期；都是 insurance 索引上的区间查询"""
+    conn = get_conn()
+    t, u = date_to_int(today), date_to_int(soon_until)
+    result = ()
+    for where, args in (("insurance < ?", (t,)), ("insurance BETWEEN ? AND ?", (t, u))):
+        n = conn.execute(f"SELECT COUNT(*) FROM vehicles WHERE {where}", args).fetchone()[0]
+        plates = [r[0] for r in conn.execute(
+            f"SELECT plate FROM vehicles WHERE {where} ORDER BY insurance LIMIT ?", args + (limit,))]
+        result += (n, plates)
+    return result
+
+
+def expired_order_ids(today):
+    """进行中/逾期且结束日期早于 today 的订单号，走 (status, end_date) 索引"""
+    rows = get_conn().execute(
+        "SELECT id FROM orders WHERE status IN ('ongoing', 'overdue') AND end_date < ? ORDER BY end_date, id",
+        (date_to_int(today),))
+    return [r[0] for r in rows]
+
+
+def active_order_due_dates(after=None):
+    """进行中/逾期订单的 (id, 结束日期)；after 给定时只要结束日期不早于它的，走 (status, end_date) 索引"""
+    sql = "SELECT id, end_date FROM orders WHERE status IN ('ongoing', 'overdue')"
+    args = ()
+    if after:
+        sql += " AND end_date >= ?"
+        args = (date_to_int(after),)
+    return [(r[0], int_to_date(r[1])) for r in get_conn().execute(sql, args)]
+
+
+def order_due_states(ids):
+    """{订单号: (结束日期, 状态)}，用于核对到期提醒时订单是否还是原样"""
+    ids = list(ids)
+    if not ids:
+        return {}
+    rows = get_conn().execute(
+        f"SELECT id, end_date, status FROM orders WHERE id IN ({', '.join('?' * len(ids))})", ids)
+    return {r[0]: (int_to_date(r[1]), r[2]) for r in rows}
+
+
+def sum_order_amount(statuses=None, start=None, end=None):
+    """订单金额合计，可按状态和起始日期区间过滤"""
+    sql, args = "SELECT TOTAL(amount) FROM orders WHERE 1 = 1", []
+    if statuses:
+        sql += f" AND status IN ({', '.join('?' * len(statuses))})"
+        args += list(statuses)
+    if start:
+        sql += " AND start_date >= ?"; args.append(date_to_int(start))
+    if end:
+        sql += " AND start_date <= ?"; args.append(date_to_int(end))
+    return get_conn().execute(sql, args).fetchone()[0]
+
+
+def sum_fine_amount(paid=None):
+    """罚款金额合计，paid=False 即未缴金额"""
+    if paid is None:
+        return get_conn().execute("SELECT TOTAL(amount) FROM fines").fetchone()[0]
+    return get_conn().execute("SELECT TOTAL(amount) FROM fines WHERE paid = ?", (int(paid),)).fetchone()[0]
+
+
+# ========== 行级写入 API ==========
+# 每个界面操作只写入它改动的那几行，不再整表删除重插
+
+def _coerce(columns, row):
+    """把界面传来的字符串就地转换成列的类型，内存里的数据和从库里读出的保持一致"""
+    for c in columns:
+        if c in _INT_COLUMNS:
+            row[c] = _to_number(row[c], integer=True)
+        elif c in _REAL_COLUMNS:
+            row[c] = _to_number(row[c])
+    return row
+
+
+def _params(columns, row):
+    params = []
+    for c in columns:
+        val = row[c]
+        if c in _BOOL_COLUMNS:
+            val = int(bool(val))
+        elif c in _DATE_COLUMNS:
+            val = date_to_int(val)
+        params.append(val)
+    return tuple(params)
+
+
+class DuplicateError(ValueError):
+    """写入违反 UNIQUE 约束（车牌、手机号、主键重复）；column 为冲突的列"""
+
+    def __init__(self, table, column):
+        super().__init__(f"{table}.{column} 重复")
+        self.table = table
+        self.column = column
+
+
+class BookingConflictError(ValueError):
+    """订单和同一辆车的其它未取消订单时间重叠（由 orders_booking_* 触发器拒绝）"""
+
+
+class ReferencedError(ValueError):
+    """要删除的客户/车辆还有订单或罚款引用（外键 ON DELETE RESTRICT 拒绝）"""
+
+    def __init__(self, table):
+        super().__init__(f"{table} 仍被订单或罚款引用")
+        self.table = table
+
+
+def _unique_guard(e):
+    """把 SQLite 的 UNIQUE 冲突转成 DuplicateError、预订重叠转成 BookingConflictError，其它完整性错误原样返回"""
+    if str(e) == BOOKING_CONFLICT:
+        return BookingConflictError(BOOKING_CONFLICT)
+    m = re.match(r"UNIQUE constraint failed: (\w+)\.(\w+)", str(e))
+    return DuplicateError(m.group(1), m.group(2)) if m else e
+
+
+def _insert_rows(table, columns, rows, fetch_ids=True, conn=None):
+    """批量插入；带 id 的行用 executemany，不带 id 的行插入后回填自增 id（fetch_ids 为假时也走 executemany）"""
+    for r in rows:
+        _coerce(columns, r)
+    with_id = [r for r in rows if r.get("id") is not None or not fetch_ids]
+    without_id = [r for r in rows if r.get("id") is None and fetch_ids]
+    conn = conn or get_conn()
+    try:
+        with conn:
+            if with_id:
+                conn.executemany(
+                    f"INSERT INTO {table} (id, {', '.join(columns)}) VALUES (?, {', '.join('?' * len(columns))})",
+                    [(r.get("id"),) + _params(columns, r) for r in with_id])
+            sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            for r in without_id:
+                r["id"] = conn.execute(sql, _params(columns, r)).lastrowid
+    except sqlite3.IntegrityError as e:
+        raise _unique_guard(e) from e
+    return [r.get("id") for r in rows]
+
+
+# 表 -> 可写的列
+TABLE_COLUMNS = {"vehicles": VEHICLE_COLUMNS, "customers": CUSTOMER_COLUMNS,
+                 "orders": ORDER_COLUMNS, "fines": FINE_COLUMNS}
+
+
+def import_rows(table, rows, conn=None):
+    """批量导入：一次 executemany 后提交（conn 上已开的事务一并提交），id 由数据库分配、不回填"""
+    _insert_rows(table, TABLE_COLUMNS[table], rows, fetch_ids=False, conn=conn)
+
+
+def _update_rows(table, columns, rows):
+    """按 id 批量更新"""
+    for r in rows:
+        _coerce(columns, r)
+    conn = get_conn()
+    try:
+        with conn:
+            conn.executemany(
+                f"UPDATE {table} SET {', '.join(c + ' = ?' for c in columns)} WHERE id = ?",
+                [_params(columns, r) + (r["id"],) for r in rows])
+    except sqlite3.IntegrityError as e:
+        raise _unique_guard(e) from e
+
+
+def _delete_rows(table, ids):
+    """按 id 批量删除；还被订单/罚款引用时抛 ReferencedError，整批都不删"""
+    conn = get_conn()
+    try:
+        with conn:
+            conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in ids])
+    except sqlite3.IntegrityError as e:
+        if str(e) == "FOREIGN KEY constraint failed":
+            raise ReferencedError(table) from e
+        raise
+
+
+# 车辆
+def insert_vehicle(v):
+    return _insert_rows("vehicles", VEHICLE_COLUMNS, [v])[0]
+
+def insert_vehicles(rows):
+    return _insert_rows("vehicles", VEHICLE_COLUMNS, rows)
+
+def update_vehicle(v):
+    _update_rows("vehicles", VEHICLE_COLUMNS, [v])
+
+def update_vehicles(rows):
+    _update_rows("vehicles", VEHICLE_COLUMNS, rows)
+
+def delete_vehicle(vid):
+    _delete_rows("vehicles", [vid])
+
+def delete_vehicles(ids):
+    _delete_rows("vehicles", ids)
+
+
+# 客户
+def insert_customer(c):
+    return _insert_rows("customers", CUSTOMER_COLUMNS, [c])[0]
+
+def insert_customers(rows):
+    return _insert_rows("customers", CUSTOMER_COLUMNS, rows)
+
+def update_customer(c):
+    _update_rows("customers", CUSTOMER_COLUMNS, [c])
+
+def update_customers(rows):
+    _update_rows("customers", CUSTOMER_COLUMNS, rows)
+
+def delete_customer(cid):
+    _delete_rows("customers", [cid])
+
+def delete_customers(ids):
+    _delete_rows("customers", ids)
+
+
+# 订单
+def insert_order(o):
+    return _insert_rows("orders", ORDER_COLUMNS, [o])[0]
+
+def insert_orders(rows):
+    return _insert_rows("orders", ORDER_COLUMNS, rows)
+
+def update_order(o):
+    _update_rows("orders", ORDER_COLUMNS, [o])
+
+def update_orders(rows):
+    _update_rows("orders", ORDER_COLUMNS, rows)
+
+def delete_order(oid):
+    _delete_rows("orders", [oid])
+
+def delete_orders(ids):
+    _delete_rows("orders", ids)
+
+
+# 罚款
+def insert_fine(f):
+    return _insert_rows("fines", FINE_COLUMNS, [f])[0]
+
+def insert_fines(rows):
+    return _insert_rows("fines", FINE_COLUMNS, rows)
+
+def update_fine(f):
+    _update_rows("fines", FINE_COLUMNS, [f])
+
+def update_fines(rows):
+    _update_rows("fines", FINE_COLUMNS, rows)
+
+def delete_fine(fid):
+    _delete_rows("fines", [fid])
+
+def delete_fines(ids):
+    _delete_rows("fines", ids)
\ No newline at end of file
@@ -0,0 +1,122 @@
+# export.py —— CSV 导出：单个列表导出和"全部导出"打包走同一条流水线，可在后台线程执行
+
+import csv
+import io
+import os
+import zipfile
+from i18n import tr
+from data import open_conn, iter_rows, count_rows, fmt_num, ENTITIES
+
+EXPORT_CHUNK_ROWS = 2000        # 每读写这么多行报告一次进度
+WRITE_BUFFER = 1 << 20          # 文件写缓冲 1MB
+
+# 实体 -> [(表头 i18n key, 取单元格值的函数 row -> 值)]
+EXPORT_COLUMNS = {
+    "vehicles": [
+        ("vehicle_id", lambda v: v["id"]), ("license_plate", lambda v: v["plate"]), ("model", lambda v: v["model"]),
+        ("year", lambda v: fmt_num(v["year"])), ("insurance_expiry", lambda v: v["insurance"]),
+        ("mileage", lambda v: fmt_num(v["mileage"])), ("monthly_price", lambda v: fmt_num(v["monthly_price"])),
+        ("deposit", lambda v: fmt_num(v["deposit"])),
+    ],
+    "customers": [
+        ("customer_id", lambda c: c["id"]), ("name", lambda c: c["name"]), ("phone", lambda c: c["phone"]),
+        ("is_corporate", lambda c: tr("yes") if c["is_corporate"] else tr("no")),
+        ("status", lambda c: tr(c["status"])), ("remark", lambda c: c["remark"]),
+    ],
+    "orders": [
+        ("order_id", lambda o: o["id"]), ("customer_name", lambda o: o["customer"]),
+        ("vehicle_plate", lambda o: o["vehicle"]), ("start_date", lambda o: o["start_date"]),
+        ("end_date", lambda o: o["end_date"]), ("order_status", lambda o: tr(o["status"])),
+        ("total_amount", lambda o: fmt_num(o["amount"])), ("remark", lambda o: o["remark"]),
+    ],
+    "fines": [
+        ("fine_id", lambda f: f["id"]), ("vehicle_plate", lambda f: f["vehicle"]),
+        ("customer_name", lambda f: f["customer"]), ("fine_type", lambda f: f["fine_type"]),
+        ("fine_amount", lambda f: fmt_num(f["amount"])), ("fine_date", lambda f: f["fine_date"]),
+        ("fine_paid", lambda f: tr("yes") if f["paid"] else tr("no")), ("remark", lambda f: f["remark"]),
+    ],
+}
+
+# 默认文件名（单表导出）/ 打包时 zip 内的文件名
+EXPORT_FILE_NAMES = {"vehicles": "车辆列表.csv", "customers": "客户列表.csv",
+                     "orders": "订单列表.csv", "fines": "罚款记录.csv"}
+
+
+def _snapshot_conn():
+    """独立连接上开一个读事务：整个导出期间读到的都是同一时刻的数据，别人照常写"""
+    conn = open_conn()
+    conn.execute("BEGIN")
+    conn.execute("SELECT 1 FROM meta LIMIT 1").fetchall()  # 第一次读时 WAL 快照才真正固定
+    return conn
+
+
+def write_entity_csv(f, entity, conn, search="", sort=(), progress=None):
+    """把一个列表按当前搜索/排序写成 CSV；progress(本表已写行数) 每 EXPORT_CHUNK_ROWS 行回调一次"""
+    columns = EXPORT_COLUMNS[entity]
+    writer = csv.writer(f)
+    writer.writerow([tr(key) for key, _ in columns])
+    done = 0
+    batch = []
+    for row in iter_rows(entity, search, sort, conn=conn, chunk_size=EXPORT_CHUNK_ROWS):
+        batch.append([fn(row) for _, fn in columns])
+        if len(batch) >= EXPORT_CHUNK_ROWS:
+            writer.writerows(batch)
+            done += len(batch)
+            batch = []
+            if progress:
+                progress(done)
+    writer.writerows(batch)
+    done += len(batch)
+    if progress:
+        progress(done)
+    return done
+
+
+def _replace_when_done(path, write):
+    """先写 path.part，成功后再替换目标文件；中途出错或取消不留半截文件"""
+    tmp = path + ".part"
+    try:
+        write(tmp)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+
+def export_csv(path, entity, search="", sort=(), progress=None):
+    """导出一个列表；progress(已写行数, 总行数)，抛异常即中止"""
+    conn = _snapshot_conn()
+    try:
+        total = count_rows(entity, search, conn)
+
+        def write(tmp):
+            with open(tmp, "w", newline="", encoding="utf-8-sig", buffering=WRITE_BUFFER) as f:
+                write_entity_csv(f, entity, conn, search, sort,
+                                 (lambda done: progress(done, total)) if progress else None)
+
+        _replace_when_done(path, write)
+    finally:
+        conn.close()
+
+
+def export_bundle(path, progress=None):
+    """全部导出：四个列表各一份 CSV 打进一个 zip，取自同一个快照；progress(已写行数, 总行数)"""
+    conn = _snapshot_conn()
+    try:
+        totals = {entity: count_rows(entity, "", conn) for entity in ENTITIES}
+        total = sum(totals.values())
+
+        def write(tmp):
+            base = 0
+            with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as zf:
+                for entity in ENTITIES:
+                    with io.TextIOWrapper(zf.open(EXPORT_FILE_NAMES[entity], "w"),
+                                          encoding="utf-8-sig", newline="") as f:
+                        write_entity_csv(f, entity, conn,
+                                         progress=(lambda done: progress(base + done, total)) if progress else None)
+                    base += totals[entity]
+
+        _replace_when_done(path, write)
+    finally:
+        conn.close()
@@ -1,13 +1,15 @@
-from data import save_all_data, vehicle_data, customer_data, fine_data
+from data import (insert_fine, update_fine, delete_fine, KeysetPager, has_rows,
+                  customer_choices, vehicle_choices, fmt_num, sum_fine_amount)
 from PyQt5.QtCore import QUrl, QDate, Qt
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem,
+    QWidget, QVBoxLayout, QLabel,
     QPushButton, QHBoxLayout, QDialog, QFormLayout, QLineEdit, QDateEdit, QTextEdit,
-    QMessageBox, QFileDialog, QCheckBox, QStackedWidget, QComboBox
+    QMessageBox, QFileDialog, QCheckBox, QStackedWidget, QComboBox, QApplication
 )
-from PyQt5.QtGui import QColor, QBrush
-import csv
 from i18n import tr, register_page
+from widgets import PageBar, LiveSearch, start_export, start_import
+from export import EXPORT_FILE_NAMES
+from table_model import RecordTableModel, make_view, PAGE_SIZE, FETCH_SIZE
 
 try:
     from PyQt5.QtWebEngineWidgets import QWebEngineView
@@ -24,12 +26,15 @@ class AddFineDialog(QDialog):
         self.setFixedSize(400, 400)
         layout = QFormLayout(self)
 
+        # 下拉框显示车牌/姓名，item data 里存外键 id
         self.vehicle = QComboBox()
-        self.vehicle.addItems([v["plate"] for v in vehicle_data])
+        for vid, plate in vehicle_choices():
+            self.vehicle.addItem(plate, vid)
         layout.addRow(tr("vehicle_plate"), self.vehicle)
 
         self.customer = QComboBox()
-        self.customer.addItems([c["name"] for c in customer_data])
+        for cid, name in customer_choices():
+            self.customer.addItem(name, cid)
         layout.addRow(tr("customer_name"), self.customer)
 
         self.fine_type = QLineEdit()
@@ -61,10 +66,10 @@ class AddFineDialog(QDialog):
         self.fid = None
         if data:
             self.fid = data.get("id")
-            self.vehicle.setCurrentText(data["vehicle"])
-            self.customer.setCurrentText(data["customer"])
+            self.vehicle.setCurrentIndex(self.vehicle.findData(data["vehicle_id"]))
+            self.customer.setCurrentIndex(self.customer.findData(data["customer_id"]))
             self.fine_type.setText(data["fine_type"])
-            self.amount.setText(data["amount"])
+            self.amount.setText(fmt_num(data["amount"]))
             self.fine_date.setDate(QDate.fromString(data["fine_date"], "yyyy-MM-dd"))
             self.paid.setChecked(data["paid"])
             self.remark.setPlainText(data["remark"])
@@ -72,6 +77,8 @@ class AddFineDialog(QDialog):
     def get_data(self):
         return {
             "id": self.fid,
+            "vehicle_id": self.vehicle.currentData(),
+            "customer_id": self.customer.currentData(),
             "vehicle": self.vehicle.currentText(),
             "customer": self.customer.currentText(),
             "fine_type": self.fine_type.text(),
@@ -86,10 +93,8 @@ class AddFineDialog(QDialog):
 class FinePage(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.page_size = 10
-        self.current_page = 1
-        self.search_text = ""
-        self.sort_reverse = False
+        self.page_size = PAGE_SIZE
+        self.pager = KeysetPager("fines", self.page_size, FETCH_SIZE)
 
         layout = QVBoxLayout(self)
         self.title = QLabel(tr("fine_manage"))
@@ -122,6 +127,7 @@ class FinePage(QWidget):
         search_btn = QPushButton(tr("search"))
         self.search_btn = search_btn
         search_btn.clicked.connect(self.do_search)
+        self.search_edit.returnPressed.connect(self.do_search)
         search_layout.addWidget(self.search_edit)
         search_layout.addWidget(search_btn)
         search_layout.addStretch()
@@ -132,42 +138,40 @@ class FinePage(QWidget):
         self.btn_add = QPushButton(tr("add_fine"))
         self.btn_delete = QPushButton(tr("delete_fine"))
         self.btn_export = QPushButton(tr("export_csv"))
+        self.btn_import = QPushButton(tr("import_csv"))
         btn_layout.addWidget(self.btn_add)
         btn_layout.addWidget(self.btn_delete)
         btn_layout.addWidget(self.btn_export)
+        btn_layout.addWidget(self.btn_import)
         btn_layout.addStretch()
+        self.total_label = QLabel()
+        btn_layout.addWidget(self.total_label)
         local_layout.addLayout(btn_layout)
 
         # 表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(8)
-        self.table.setHorizontalHeaderLabels([
-            tr("fine_id"), tr("vehicle_plate"), tr("customer_name"), tr("fine_type"),
-            tr("fine_amount"), tr("fine_date"), tr("fine_paid"), tr("remark")
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSortingEnabled(False)
+        self.model = RecordTableModel(self.pager, [
+            ("fine_id", lambda f: str(f["id"]), "id"), ("vehicle_plate", lambda f: f["vehicle"]),
+            ("customer_name", lambda f: f["customer"]),
+            ("fine_type", lambda f: f["fine_type"], "fine_type"),
+            ("fine_amount", lambda f: fmt_num(f["amount"]), "amount"),
+            ("fine_date", lambda f: f["fine_date"], "fine_date"),
+            ("fine_paid", lambda f: tr("yes") if f["paid"] else tr("no"), "paid"),
+            ("remark", lambda f: f["remark"], "remark"),
+        ], self.cell_style, self)
+        self.table = make_view(self.model)
         local_layout.addWidget(self.table)
 
         # 分页控件
-        page_layout = QHBoxLayout()
-        self.btn_prev = QPushButton(tr("prev_page"))
-        self.btn_next = QPushButton(tr("next_page"))
-        self.lbl_page = QLabel()
-        page_layout.addStretch()
-        page_layout.addWidget(self.btn_prev)
-        page_layout.addWidget(self.lbl_page)
-        page_layout.addWidget(self.btn_next)
-        page_layout.addStretch()
-        local_layout.addLayout(page_layout)
+        self.page_bar = PageBar(self.pager)
+        local_layout.addWidget(self.page_bar)
+        self.live_search = LiveSearch(self.search_edit, self.model, self.page_bar, self)
 
         self.btn_add.clicked.connect(self.add_fine)
         self.btn_delete.clicked.connect(self.delete_fine)
         self.btn_export.clicked.connect(self.export_csv)
-        self.table.cellDoubleClicked.connect(self.edit_fine)
-        self.btn_prev.clicked.connect(self.prev_page)
-        self.btn_next.clicked.connect(self.next_page)
+        self.btn_import.clicked.connect(self.import_csv)
+        self.table.doubleClicked.connect(lambda idx: self.edit_fine(idx.row(), idx.column()))
+        self.page_bar.page_changed.connect(self.show_page)
 
         self.stacked.addWidget(self.local_widget)
 
@@ -200,122 +204,88 @@ class FinePage(QWidget):
         self.btn_add.setText(tr("add_fine"))
         self.btn_delete.setText(tr("delete_fine"))
         self.btn_export.setText(tr("export_csv"))
-        self.btn_prev.setText(tr("prev_page"))
-        self.btn_next.setText(tr("next_page"))
+        self.btn_import.setText(tr("import_csv"))
+        self.page_bar.refresh_texts()
         self.search_edit.setPlaceholderText(tr("search_fine_placeholder"))
         self.search_btn.setText(tr("search"))
-        self.table.setHorizontalHeaderLabels([
-            tr("fine_id"), tr("vehicle_plate"), tr("customer_name"), tr("fine_type"),
-            tr("fine_amount"), tr("fine_date"), tr("fine_paid"), tr("remark")
-        ])
-        self.refresh_table()
+        self.update_total_label()
+        self.model.retranslate()
 
     # ===== 排序逻辑 =====
     def sort_by_column(self, column):
-        self.sort_reverse = not getattr(self, "sort_reverse", False)
-        col_map = {0:"id",1:"vehicle",2:"customer",3:"fine_type",4:"amount",5:"fine_date",6:"paid",7:"remark"}
-        key = col_map.get(column)
+        # Shift+单击表头：在已有排序后面再加一列
+        key = self.model.sort_column(column)
         if not key: return
-        def sort_key(x):
-            val=x.get(key,"")
-            if isinstance(val,(int,float,bool)): return val
-            if isinstance(val,str) and val.replace(".","",1).isdigit(): return float(val)
-            return str(val).lower()
-        fine_data.sort(key=sort_key, reverse=self.sort_reverse)
-        self.refresh_table()
+        self.pager.toggle_sort(key, append=bool(QApplication.keyboardModifiers() & Qt.ShiftModifier))
+        self.show_page()
 
     # ===== 逻辑 =====
     def show_local(self): self.stacked.setCurrentIndex(0)
     def show_official(self): self.stacked.setCurrentIndex(1)
 
     def do_search(self):
-        self.search_text=self.search_edit.text().strip(); self.current_page=1; self.refresh_table()
-
-    def get_filtered_data(self):
-        if not self.search_text: return fine_data
-        return [f for f in fine_data if self.search_text.lower() in f["vehicle"].lower()
-                or self.search_text.lower() in f["customer"].lower()
-                or self.search_text.lower() in f["fine_type"].lower()]
+        self.live_search.cancel()
+        self.pager.set_query(search=self.search_edit.text().strip()); self.show_page()
 
     def refresh_table(self):
-        filtered=self.get_filtered_data()
-        total=len(filtered); total_pages=max(1,(total+self.page_size-1)//self.page_size)
-        self.current_page=min(self.current_page,total_pages)
-        start=(self.current_page-1)*self.page_size; end=min(start+self.page_size,total)
-        page_data=filtered[start:end]
-        self.table.setRowCount(len(page_data))
-        for row,f in enumerate(page_data):
-            self.table.setItem(row,0,QTableWidgetItem(str(f.get("id",row+1))))
-            self.table.setItem(row,1,QTableWidgetItem(f["vehicle"]))
-            self.table.setItem(row,2,QTableWidgetItem(f["customer"]))
-            self.table.setItem(row,3,QTableWidgetItem(f["fine_type"]))
-            self.table.setItem(row,4,QTableWidgetItem(f["amount"]))
-            self.table.setItem(row,5,QTableWidgetItem(f["fine_date"]))
-            paid_item=QTableWidgetItem(tr("yes") if f["paid"] else tr("no"))
-            if not f["paid"]:
-                paid_item.setBackground(QBrush(QColor("#ff4d4f"))); paid_item.setForeground(QBrush(QColor("#ffffff")))
-            self.table.setItem(row,6,paid_item)
-            self.table.setItem(row,7,QTableWidgetItem(f["remark"]))
-        self.lbl_page.setText(tr("page_info").format(self.current_page,total_pages,total))
-        self.btn_prev.setEnabled(self.current_page>1)
-        self.btn_next.setEnabled(self.current_page<total_pages)
+        self.update_total_label()
+        self.pager.reload(); self.model.refresh(); self.page_bar.update_state()
+
+    def update_total_label(self):
+        # 未缴金额直接在 SQLite 里合计
+        self.total_label.setText(tr("unpaid_fine_total").format(fmt_num(sum_fine_amount(paid=False))))
+
+    def show_page(self):
+        self.model.reset(); self.page_bar.update_state()
+
+    def cell_style(self,f,col):
+        # 未缴罚款：红底白字
+        return ("#ff4d4f","#ffffff") if col==6 and not f["paid"] else (None,None)
 
     # ===== CRUD =====
     def add_fine(self):
-        if not customer_data or not vehicle_data:
+        if not has_rows("customers") or not has_rows("vehicles"):
             QMessageBox.warning(self,tr("tip"),tr("add_customer_vehicle_first")); return
         dialog=AddFineDialog(self)
         if dialog.exec_():
             data=dialog.get_data()
-            if not data["vehicle"] or not data["customer"] or not data["fine_type"]:
+            if data["vehicle_id"] is None or data["customer_id"] is None or not data["fine_type"]:
                 QMessageBox.warning(self,tr("tip"),tr("fine_required")); return
             if not data["amount"].replace(".","",1).isdigit():
                 QMessageBox.warning(self,tr("tip"),tr("amount_invalid")); return
-            data["id"]=max([f.get("id",0) for f in fine_data],default=0)+1
-            fine_data.append(data); save_all_data(); self.refresh_table()
+            insert_fine(data); self.refresh_table()
 
     def delete_fine(self):
-        row=self.table.currentRow()
+        row=self.table.currentIndex().row()
         if row==-1:
             QMessageBox.warning(self,tr("tip"),tr("select_fine")); return
-        filtered=self.get_filtered_data()
-        target=filtered[(self.current_page-1)*self.page_size+row]
-        fine_id=target.get("id",row+1)
+        target=self.model.record(row)
+        if not target:return
+        fine_id=target["id"]
         reply=QMessageBox.question(self,tr("delete_fine"),tr("confirm_delete_fine").format(fine_id),QMessageBox.Yes|QMessageBox.No)
         if reply==QMessageBox.Yes:
-            fine_data.remove(target); save_all_data(); self.refresh_table()
+            delete_fine(fine_id); self.refresh_table()
 
     def edit_fine(self,row,column):
-        filtered=self.get_filtered_data()
-        target=filtered[(self.current_page-1)*self.page_size+row]
+        target=self.model.record(row)
+        if not target:return
         dialog=AddFineDialog(self,target)
         if dialog.exec_():
             new_data=dialog.get_data()
-            if not new_data["vehicle"] or not new_data["customer"] or not new_data["fine_type"]:
+            if new_data["vehicle_id"] is None or new_data["customer_id"] is None or not new_data["fine_type"]:
                 QMessageBox.warning(self,tr("tip"),tr("fine_required")); return
             if not new_data["amount"].replace(".","",1).isdigit():
                 QMessageBox.warning(self,tr("tip"),tr("amount_invalid")); return
-            new_data["id"]=target.get("id")
-            idx=fine_data.index(target)
-            fine_data[idx]=new_data; save_all_data(); self.refresh_table()
+            new_data["id"]=target["id"]
+            update_fine(new_data); self.refresh_table()
 
     # ===== 分页 & 导出 =====
-    def prev_page(self):
-        if self.current_page>1:self.current_page-=1; self.refresh_table()
-    def next_page(self):
-        total=len(self.get_filtered_data()); total_pages=max(1,(total+self.page_size-1)//self.page_size)
-        if self.current_page<total_pages:self.current_page+=1; self.refresh_table()
     def export_csv(self):
-        path,_=QFileDialog.getSaveFileName(self,tr("export_csv"),"罚款记录.csv","CSV Files (*.csv)")
+        path,_=QFileDialog.getSaveFileName(self,tr("export_csv"),EXPORT_FILE_NAMES["fines"],"CSV Files (*.csv)")
+        if not path:return
+        start_export(self,path,"fines",self.pager.search,self.pager.sort)
+
+    def import_csv(self):
+        path,_=QFileDialog.getOpenFileName(self,tr("import_csv"),"","CSV Files (*.csv)")
         if not path:return
-        try:
-            with open(path,"w",newline='',encoding="utf-8-sig")as f:
-                writer=csv.writer(f)
-                writer.writerow([tr("fine_id"),tr("vehicle_plate"),tr("customer_name"),tr("fine_type"),
-                                 tr("fine_amount"),tr("fine_date"),tr("fine_paid"),tr("remark")])
-                for f_item in self.get_filtered_data():
-                    writer.writerow([f_item.get("id"),f_item["vehicle"],f_item["customer"],f_item["fine_type"],
-                                     f_item["amount"],f_item["fine_date"],tr("yes") if f_item["paid"] else tr("no"),f_item["remark"]])
-            QMessageBox.information(self,tr("export_csv"),tr("export_success"))
-        except Exception as e:
-            QMessageBox.critical(self,tr("export_csv"),tr("export_failed")+"\n"+str(e))
\ No newline at end of file
+        start_import(self,path,"fines",self.refresh_table)
\ No newline at end of file
@@ -1,173 +1,114 @@
-# i18n.py
-
-LANG = {
-    "zh": {
-        # 通用
-        "ok": "确定",
-        "cancel": "取消",
-        "tip": "提示",
-        "yes": "是",
-        "no": "否",
-        "search": "搜索",
-        "export_csv": "导出CSV",
-        "export_success": "已导出！",
-        "export_failed": "导出失败",
-        "prev_page": "上一页",
-        "next_page": "下一页",
-        "page_info": "第 {0} / {1} 页（共 {2} 条）",
-
-        # 菜单/主界面
-        "vehicle": "车辆管理",
-        "customer": "客户管理",
-        "order": "订单管理",
-        "fine": "罚款记录",
-        "menu": "菜单",
-        "lang": "中/English",
-        "backup": "一键备份",
-        "switch_success": "语言切换成功！",
-        "backup_success": "备份成功！",
-        "backup_failed": "备份失败！",
-        "title": "车辆租赁管理系统",
-        "uae_time": "阿联酋时间",
-
-        # 车辆管理
-        "vehicle_manage": "车辆管理页面",
-        "add_vehicle": "添加车辆",
-        "delete_vehicle": "删除车辆",
-        "license_plate": "车牌号",
-        "model": "型号",
-        "year": "年份",
-        "insurance_expiry": "保险到期日",
-        "mileage": "里程数",
-        "monthly_price": "月租价",
-        "status": "状态",
-        "idle": "空闲",
-        "rented": "已租",
-        "deposit": "押金",
-        "remark": "备注",
-        "search_placeholder": "输入车牌号/型号搜索",
-        "plate_required": "车牌号、型号、年份不能为空！",
-        "year_number": "年份必须为数字！",
-        "plate_exists": "车牌号已存在！",
-        "confirm_delete": "确定要删除车辆 {0} 吗？",
-        "insurance_expired": "保险到期车辆：",
-        "select_vehicle": "请先选中要删除的车辆！",
-
-        # 客户管理
-        "customer_manage": "客户管理页面",
-        "add_customer": "添加客户",
-        "delete_customer": "删除客户",
-        "name": "姓名",
-        "phone": "手机号",
-        "is_corporate": "企业客户",
-        "normal": "普通",
-        "vip": "VIP",
-        "blacklist": "黑名单",
-        "order_history": "历史订单",
-        "order_history_list": "该客户所有历史订单：",
-        "order_info": "订单信息",
-        "view_history": "查看",
-        "search_customer_placeholder": "输入姓名/手机号搜索",
-        "name_phone_required": "姓名和手机号不能为空！",
-        "phone_invalid": "手机号格式不正确！",
-        "phone_exists": "手机号已存在！",
-        "confirm_delete_customer": "确定要删除客户 {0} 吗？",
-        "select_customer": "请先选中要删除的客户！",
-
-        # 订单管理
-        "order_manage": "订单管理页面",
-        "add_order": "添加订单",
-        "delete_order": "删除订单",
-        "renew_order": "续租订单",
-        "order_id": "订单编号",
-        "customer_name": "客户姓名",
-        "vehicle_plate": "车牌号",
-        "start_date": "起始日期",
-        "end_date": "结束日期",
-        "order_status": "订单状态",
-        "total_amount": "总金额",
-        "ongoing": "进行中",
-        "completed": "已完成",
-        "overdue": "逾期",
-        "cancelled": "已取消",
-        "search_order_placeholder": "输入客户/车牌/状态搜索",
-        "order_expired": "租赁到期订单：",
-        "add_customer_vehicle_first": "请先添加客户和车辆！",
-        "customer_vehicle_required": "客户和车辆不能为空！",
-        "date_invalid": "起止日期不正确！",
-        "amount_invalid": "金额格式不正确！",
-        "select_order": "请先选中要操作的订单！",
-        "confirm_delete_order": "确定要删除订单 {0} 吗？",
-        "new_end_date": "新结束日期",
-        "renew_date_error": "新结束日期必须大于原结束日期！",
-
-        # 罚款记录
-        "fine_manage": "罚款记录页面",
-        "add_fine": "添加罚款",
-        "delete_fine": "删除罚款",
-        "fine_id": "编号",
-        "fine_type": "罚款类型",
-        "fine_amount": "罚款金额",
-        "fine_date": "罚款日期",
-        "fine_paid": "已缴纳",
-        "fine_required": "车牌号、客户、罚款类型不能为空！",
-        "select_fine": "请先选中要删除的罚款记录！",
-        "confirm_delete_fine": "确定要删除罚款记录 {0} 吗？",
-        "search_fine_placeholder": "输入车牌号/客户/类型搜索",
-        "local_fine_record": "本地罚款记录",
-        "official_fine_query": "迪拜交警官网查询",
-        "webengine_not_available": "未安装WebEngine，无法嵌入官网页面。"
-    },
-    "en": {
-        # 通用（与上面对应，这里不重复）
-        "ok": "OK",
-        "cancel": "Cancel",
-        "tip": "Tip",
-        "yes": "Yes",
-        "no": "No",
-        "search": "Search",
-        "export_csv": "Export CSV",
-        "export_success": "Exported!",
-        "export_failed": "Export failed",
-        "prev_page": "Prev",
-        "next_page": "Next",
-        "page_info": "Page {0} / {1} (Total {2})",
-        # ... 省略，其余对应前面 zh 的 key（你已有完整定义）
-    }
-}
+# i18n.py —— 翻译目录：locales/<语言>.json，首次加载时编译成正反两张表并缓存到磁盘
+
+import json
+import os
+import pickle
+import weakref
+
+try:
+    from PyQt5 import sip
+except ImportError:
+    sip = None
+
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+CACHE_DIR = os.path.join(LOCALE_DIR, "__pycache__")
+CACHE_VERSION = 3
+
+# 已编译的目录：语言 -> ({key: 译文}, {译文或 key（小写）: key 集合})
+_catalogs = {}
+# 所有语言合并的反向表，reverse_catalog() 第一次调用时建
+_reverse_all = None
 
 # 当前语言
 current_lang = "zh"
-
-# 已注册的页面（便于统一刷新文字）
-registered_pages = []
+_forward = {}
+
+# 已注册的页面（便于统一刷新文字）；弱引用，页面销毁后自动移除
+registered_pages = weakref.WeakSet()
+
+
+def available_languages():
+    """locales 目录下有目录文件的语言"""
+    return sorted(name[:-5] for name in os.listdir(LOCALE_DIR) if name.endswith(".json"))
+
+
+def _compile(messages):
+    reverse = {}
+    for k, v in messages.items():
+        # 同一段译文可能对应好几个 key；key 本身也收进来，CSV 里直接写 key 也认
+        reverse.setdefault(v.strip().lower(), set()).add(k)
+        reverse.setdefault(k.lower(), set()).add(k)
+    return messages, reverse
+
+
+def load_catalog(lang):
+    """读取并编译一种语言的目录；JSON 文件没变时直接用磁盘缓存"""
+    if lang in _catalogs:
+        return _catalogs[lang]
+    src = os.path.join(LOCALE_DIR, lang + ".json")
+    st = os.stat(src)
+    stamp = (CACHE_VERSION, st.st_mtime_ns, st.st_size)
+    cache = os.path.join(CACHE_DIR, lang + ".pickle")
+    catalog = None
+    try:
+        with open(cache, "rb") as f:
+            cached_stamp, cached = pickle.load(f)
+        if cached_stamp == stamp:
+            catalog = cached
+    except (OSError, pickle.PickleError, EOFError, ValueError, TypeError):
+        pass
+    if catalog is None:
+        with open(src, encoding="utf-8") as f:
+            catalog = _compile(json.load(f))
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(cache + ".tmp", "wb") as f:
+                pickle.dump((stamp, catalog), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(cache + ".tmp", cache)
+        except OSError:
+            pass    # 目录只读时不缓存，下次再编译
+    _catalogs[lang] = catalog
+    return catalog
 
 
 def tr(key):
     """获取翻译文本"""
-    return LANG[current_lang].get(key, key)
+    return _forward.get(key, key)
 
 
-def tr_reverse(value):
-    """通过翻译值找到原始 key"""
-    for k, v in LANG[current_lang].items():
-        if v == value:
-            return k
-    return value
+def reverse_catalog():
+    """所有语言的反向表合在一起：译文或 key（去空白、小写）-> key 集合；导入 CSV 时按它认表头和状态值"""
+    global _reverse_all
+    if _reverse_all is None:
+        merged = {}
+        for lang in available_languages():
+            for text, keys in load_catalog(lang)[1].items():
+                merged.setdefault(text, set()).update(keys)
+        _reverse_all = merged
+    return _reverse_all
 
 
 def set_language(lang):
     """切换语言并刷新所有页面"""
-    global current_lang
-    if lang in LANG:
-        current_lang = lang
-        for page in registered_pages:
-            if hasattr(page, "refresh_texts"):
-                page.refresh_texts()
-        return True
-    return False
+    global current_lang, _forward
+    try:
+        _forward = load_catalog(lang)[0]
+    except OSError:
+        return False
+    current_lang = lang
+    for page in list(registered_pages):
+        # Qt 一侧已销毁但 Python 包装还没回收的页面直接跳过
+        if sip is not None and sip.isdeleted(page):
+            registered_pages.discard(page)
+            continue
+        if hasattr(page, "refresh_texts"):
+            page.refresh_texts()
+    return True
 
 
 def register_page(page):
     """页面初始化时调用，用于支持语言切换"""
-    registered_pages.append(page)
\ No newline at end of file
+    registered_pages.add(page)
+
+
+_forward = load_catalog(current_lang)[0]
\ No newline at end of file
@@ -0,0 +1,326 @@
+# importer.py —— CSV 批量导入：按块流式读取，逐块按页面上的规则校验后一个事务 executemany 写入，出错的行写进报告
+
+import csv
+import datetime
+import io
+import json
+import os
+from i18n import tr, reverse_catalog
+from data import open_conn, import_rows, booking_conflicts, CUSTOMER_STATUSES, ORDER_STATUSES
+
+IMPORT_CHUNK_ROWS = 2000        # 每块行数：一块一次校验查询、一次 executemany、一个事务
+READ_BUFFER = 1 << 20           # 文件读缓冲 1MB
+
+# 实体 -> {表头 i18n key: 字段}；和导出的表头一致，导出的文件可以直接导回来。
+# 第一列编号不导入，id 由数据库分配；订单、罚款里的客户按姓名、车辆按车牌找
+IMPORT_FIELDS = {
+    "vehicles": {"license_plate": "plate", "model": "model", "year": "year", "insurance_expiry": "insurance",
+                 "mileage": "mileage", "monthly_price": "monthly_price", "deposit": "deposit", "remark": "remark"},
+    "customers": {"name": "name", "phone": "phone", "is_corporate": "is_corporate", "status": "status",
+                  "remark": "remark"},
+    "orders": {"customer_name": "customer", "vehicle_plate": "vehicle", "start_date": "start_date",
+               "end_date": "end_date", "order_status": "status", "total_amount": "amount", "remark": "remark"},
+    "fines": {"vehicle_plate": "vehicle", "customer_name": "customer", "fine_type": "fine_type",
+              "fine_amount": "amount", "fine_date": "fine_date", "fine_paid": "paid", "remark": "remark"},
+}
+
+# 文件里必须有的列
+REQUIRED_FIELDS = {
+    "vehicles": ("plate", "model", "year"),
+    "customers": ("name", "phone"),
+    "orders": ("customer", "vehicle", "start_date", "end_date", "amount"),
+    "fines": ("vehicle", "customer", "fine_type", "amount", "fine_date"),
+}
+
+
+def _map_header(entity, header, keys):
+    """表头 -> [(列号, 字段)]；缺必需列时抛 ValueError"""
+    fields = IMPORT_FIELDS[entity]
+    mapped = []
+    for i, cell in enumerate(header or []):
+        for key in keys.get(cell.strip().lower(), ()):
+            if key in fields:
+                mapped.append((i, fields[key]))
+                break
+    missing = set(REQUIRED_FIELDS[entity]) - {f for _, f in mapped}
+    if missing:
+        names = [tr(k) for k, f in fields.items() if f in missing]
+        raise ValueError(tr("import_bad_header").format(", ".join(names)))
+    return mapped
+
+
+def _choice(value, keys, choices, default):
+    """翻译过的文字或原始代码 -> choices 里的代码；空值取 default，认不出时返回 None"""
+    if not value:
+        return default
+    found = keys.get(value.lower(), set()) & set(choices)
+    return found.pop() if len(found) == 1 else None
+
+
+def _flag(value, keys):
+    """是/否、yes/no、1/0 -> bool；认不出时返回 None"""
+    if value.lower() in ("1", "true"):
+        return True
+    if value.lower() in ("0", "false"):
+        return False
+    code = _choice(value, keys, ("yes", "no"), "no")
+    return None if code is None else code == "yes"
+
+
+def _is_number(value):
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _date_error(r, field, required=True):
+    """日期只收 yyyy-MM-dd；合法时返回 None"""
+    value = r[field]
+    if not value and not required:
+        r[field] = None
+        return None
+    if len(value) == 10:
+        try:
+            datetime.date.fromisoformat(value)
+            return None
+        except ValueError:
+            pass
+    return tr("import_date_format").format(value)
+
+
+# ===== 逐行规则：和各页面新增时的检查相同；通过时就地整理好字段，返回 None =====
+def _vehicle_error(r, keys):
+    r["plate"] = r["plate"].upper()
+    if not r["plate"] or not r["model"] or not r["year"]:
+        return tr("plate_required")
+    if not r["year"].isdigit():
+        return tr("year_number")
+    for c in ("mileage", "monthly_price", "deposit"):
+        if r[c] and not _is_number(r[c]):
+            return tr("amount_invalid")
+    return _date_error(r, "insurance", required=False)
+
+
+def _customer_error(r, keys):
+    if not r["name"] or not r["phone"]:
+        return tr("name_phone_required")
+    if not r["phone"].isdigit() or len(r["phone"]) < 6:
+        return tr("phone_invalid")
+    r["is_corporate"] = _flag(r["is_corporate"], keys)
+    if r["is_corporate"] is None:
+        return tr("import_value_invalid").format(tr("is_corporate"))
+    r["status"] = _choice(r["status"], keys, CUSTOMER_STATUSES, "normal")
+    if r["status"] is None:
+        return tr("import_value_invalid").format(tr("status"))
+    return None
+
+
+def _order_error(r, keys):
+    if not r["customer"] or not r["vehicle"]:
+        return tr("customer_vehicle_required")
+    err = _date_error(r, "start_date") or _date_error(r, "end_date")
+    if err:
+        return err
+    if r["start_date"] > r["end_date"]:
+        return tr("date_invalid")
+    if not _is_number(r["amount"]):
+        return tr("amount_invalid")
+    r["status"] = _choice(r["status"], keys, ORDER_STATUSES, "ongoing")
+    if r["status"] is None:
+        return tr("import_value_invalid").format(tr("order_status"))
+    return None
+
+
+def _fine_error(r, keys):
+    if not r["vehicle"] or not r["customer"] or not r["fine_type"]:
+        return tr("fine_required")
+    if not r["amount"].replace(".", "", 1).isdigit():
+        return tr("amount_invalid")
+    err = _date_error(r, "fine_date")
+    if err:
+        return err
+    r["paid"] = _flag(r["paid"], keys)
+    if r["paid"] is None:
+        return tr("import_value_invalid").format(tr("fine_paid"))
+    return None
+
+
+ROW_CHECKS = {"vehicles": _vehicle_error, "customers": _customer_error,
+              "orders": _order_error, "fines": _fine_error}
+
+
+# ===== 整块规则：一块只查一次库，值以 JSON 数组传进去，json_each 展开后走唯一索引 / 排序索引 =====
+def _lookup(conn, sql, values):
+    return conn.execute(sql, (json.dumps(sorted(values)),)).fetchall()
+
+
+def _check_unique(conn, table, column, message, rows, seen):
+    """库里已有的值一次查出；文件里前面已导入的值记在 seen 里，同一文件里重复的行只留第一行"""
+    taken = {v for v, in _lookup(
+        conn, f"SELECT {column} FROM {table} WHERE {column} IN (SELECT value FROM json_each(?))",
+        {r[column] for _, r, _ in rows})}
+    ok, errors = [], []
+    for item in rows:
+        value = item[1][column]
+        if value in taken or value in seen:
+            errors.append((item[0], tr(message), item[2]))
+        else:
+            seen.add(value)
+            ok.append(item)
+    return ok, errors
+
+
+def _check_refs(conn, rows):
+    """车牌 -> 车辆 id，姓名（不分大小写）-> 客户 id；重名的客户不猜"""
+    vehicles = dict(_lookup(
+        conn, "SELECT plate, id FROM vehicles WHERE plate IN (SELECT value FROM json_each(?))",
+        {r["vehicle"].upper() for _, r, _ in rows}))
+    customers = {}
+    for name, cid in _lookup(
+            conn, "SELECT name, id FROM customers WHERE name COLLATE NOCASE IN (SELECT value FROM json_each(?))",
+            {r["customer"] for _, r, _ in rows}):
+        customers.setdefault(name.lower(), []).append(cid)
+    ok, errors = [], []
+    for line, r, cells in rows:
+        vid = vehicles.get(r["vehicle"].upper())
+        cids = customers.get(r["customer"].lower(), [])
+        if vid is None:
+            errors.append((line, tr("import_not_found").format(r["vehicle"]), cells))
+        elif not cids:
+            errors.append((line, tr("import_not_found").format(r["customer"]), cells))
+        elif len(cids) > 1:
+            errors.append((line, tr("import_ambiguous_customer").format(r["customer"]), cells))
+        else:
+            r["vehicle_id"], r["customer_id"] = vid, cids[0]
+            ok.append((line, r, cells))
+    return ok, errors
+
+
+def _check_bookings(conn, rows):
+    """未取消的订单不能和同一辆车已有的订单（查 order_spans）或本块前面的行时间重叠；前面各块已经提交，查库就能查到"""
+    accepted = {}   # 车辆 id -> [(开始, 结束, 行号)]
+    ok, errors = [], []
+    for line, r, cells in rows:
+        if r["status"] != "cancelled":
+            ids = booking_conflicts(r["vehicle_id"], r["start_date"], r["end_date"], conn=conn)
+            if ids:
+                errors.append((line, tr("vehicle_booked").format(", ".join(map(str, ids))), cells))
+                continue
+            spans = accepted.setdefault(r["vehicle_id"], [])
+            clash = next((n for s, e, n in spans if s <= r["end_date"] and e >= r["start_date"]), None)
+            if clash is not None:
+                errors.append((line, tr("import_booked_in_file").format(clash), cells))
+                continue
+            spans.append((r["start_date"], r["end_date"], line))
+        ok.append((line, r, cells))
+    return ok, errors
+
+
+def _check_orders(conn, rows, seen):
+    rows, errors = _check_refs(conn, rows)
+    rows, more = _check_bookings(conn, rows)
+    return rows, errors + more
+
+
+SET_CHECKS = {
+    "vehicles": lambda conn, rows, seen: _check_unique(conn, "vehicles", "plate", "plate_exists", rows, seen),
+    "customers": lambda conn, rows, seen: _check_unique(conn, "customers", "phone", "phone_exists", rows, seen),
+    "orders": _check_orders,
+    "fines": lambda conn, rows, seen: _check_refs(conn, rows),
+}
+
+
+def _import_chunk(conn, entity, fields, keys, batch, seen):
+    """一块行：先逐行查格式，再整块查唯一性和引用，最后 executemany 写入。
+    校验和写入在同一个写事务里，中间不会有别人插进同一个车牌、手机号；返回 (写入行数, [(行号, 错误, 原始单元格)])"""
+    check = ROW_CHECKS[entity]
+    rows, errors = [], []
+    for line, cells in batch:
+        r = dict.fromkeys(IMPORT_FIELDS[entity].values(), "")
+        for i, field in fields:
+            if i < len(cells):
+                r[field] = cells[i].strip()
+        err = check(r, keys)
+        if err:
+            errors.append((line, err, cells))
+        else:
+            rows.append((line, r, cells))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if rows:
+            rows, more = SET_CHECKS[entity](conn, rows, seen)
+            errors += more
+        if rows:
+            import_rows(entity, [r for _, r, _ in rows], conn)
+        else:
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    errors.sort(key=lambda e: e[0])
+    return len(rows), errors
+
+
+class _ErrorReport:
+    """出错的行写到 <源文件名>_errors.csv：行号、原因，后面跟原来的各列；第一条错误出现时才建文件"""
+
+    def __init__(self, path, header):
+        self.path = os.path.splitext(path)[0] + "_errors.csv"
+        self.header = header
+        self.f = self.writer = None
+
+    def write(self, errors):
+        if not errors:
+            return
+        if self.writer is None:
+            self.f = open(self.path, "w", newline="", encoding="utf-8-sig")
+            self.writer = csv.writer(self.f)
+            self.writer.writerow([tr("import_line"), tr("import_error")] + list(self.header))
+        self.writer.writerows([line, message] + cells for line, message, cells in errors)
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+        return self.path if self.writer is not None else ""
+
+
+def import_csv(path, entity, progress=None):
+    """把 CSV 导入 entity 对应的表；progress(已读字节, 文件字节数)，抛异常即中止（已提交的块保留）。
+    返回 (导入行数, 出错行数, 错误报告路径，没有出错时为空)"""
+    total = os.path.getsize(path)
+    keys = reverse_catalog()
+    imported = failed = 0
+    seen = set()
+    conn = open_conn()
+    report = None
+    try:
+        with open(path, "rb", buffering=READ_BUFFER) as raw:
+            reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+            header = next(reader, None)
+            fields = _map_header(entity, header, keys)
+            report = _ErrorReport(path, header)
+
+            def flush(batch):
+                nonlocal imported, failed
+                n, errors = _import_chunk(conn, entity, fields, keys, batch, seen)
+                imported += n
+                failed += len(errors)
+                report.write(errors)
+                if progress:
+                    progress(raw.tell(), total)
+
+            batch = []
+            for cells in reader:
+                if not any(c.strip() for c in cells):
+                    continue
+                batch.append((reader.line_num, cells))
+                if len(batch) >= IMPORT_CHUNK_ROWS:
+                    flush(batch)
+                    batch = []
+            flush(batch)
+    finally:
+        conn.close()
+        report_path = report.close() if report else ""
+    return imported, failed, report_path
@@ -1,15 +1,16 @@
-from data import load_all_data
-load_all_data()
 import os
-import shutil
 import sys
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QStackedWidget, QLabel, QMessageBox, QFileDialog
+    QPushButton, QStackedWidget, QLabel, QMessageBox, QFileDialog, QProgressDialog, QLineEdit
 )
 from PyQt5.QtCore import Qt, QTimer, QDateTime, QSettings
 from PyQt5.QtGui import QFont, QIcon
-from i18n import tr, LANG, current_lang
+import i18n
+from i18n import tr, register_page
+from data import startup, close_conn, DB_FILE
+from workers import BackupWorker
+from widgets import GlobalSearchDialog, start_export, stop_file_workers
 
 from vehicle_page import VehiclePage
 from customer_page import CustomerPage
@@ -36,6 +37,13 @@ class MainWindow(QMainWindow):
         settings = QSettings("Ezown", "CarRental")
         settings.setValue("geometry", self.saveGeometry())
         settings.setValue("windowState", self.saveState())
+        if getattr(self, "backup_worker", None) and self.backup_worker.isRunning():
+            self.backup_worker.requestInterruption()
+            self.backup_worker.wait()
+        for page in (self.vehicle_page, self.customer_page, self.order_page, self.fine_page):
+            page.live_search.stop()
+        stop_file_workers()
+        close_conn()
         super().closeEvent(event)
 
     def init_ui(self):
@@ -76,7 +84,7 @@ class MainWindow(QMainWindow):
         font-size: 15px;
         font-family: 'Segoe UI', 'Microsoft YaHei', Arial;
     }
-    QTableWidget {
+    QTableView {
         background: #fff;
         border-radius: 8px;
         font-size: 14px;
@@ -105,7 +113,8 @@ class MainWindow(QMainWindow):
         sidebar_layout = QVBoxLayout(sidebar)
         sidebar_layout.setSpacing(18)
         sidebar_layout.setContentsMargins(18, 18, 18, 18)
-        sidebar_layout.addWidget(QLabel(f"<h2 style='color:#fff;font-weight:bold;'>{tr('menu')}</h2>"))
+        self.menu_label = QLabel(f"<h2 style='color:#fff;font-weight:bold;'>{tr('menu')}</h2>")
+        sidebar_layout.addWidget(self.menu_label)
 
         self.btn_vehicle = QPushButton(tr("vehicle"))
         self.btn_customer = QPushButton(tr("customer"))
@@ -120,8 +129,10 @@ class MainWindow(QMainWindow):
 
         self.btn_lang = QPushButton(tr("lang"))
         self.btn_backup = QPushButton(tr("backup"))
+        self.btn_export_all = QPushButton(tr("export_all"))
         sidebar_layout.addWidget(self.btn_lang)
         sidebar_layout.addWidget(self.btn_backup)
+        sidebar_layout.addWidget(self.btn_export_all)
 
         main_layout.addWidget(sidebar)
 
@@ -134,6 +145,13 @@ class MainWindow(QMainWindow):
         top_bar = QHBoxLayout()
         top_bar.setContentsMargins(18, 12, 18, 6)
         top_bar.setSpacing(12)
+
+        # 全局搜索（四类记录一起搜）
+        self.global_search = QLineEdit()
+        self.global_search.setPlaceholderText(tr("global_search_placeholder"))
+        self.global_search.setMinimumWidth(360)
+        self.global_search.returnPressed.connect(self.do_global_search)
+        top_bar.addWidget(self.global_search)
         top_bar.addStretch()
 
         # 阿联酋时间显示
@@ -167,6 +185,7 @@ class MainWindow(QMainWindow):
 
         self.btn_lang.clicked.connect(self.switch_language)
         self.btn_backup.clicked.connect(self.backup_database)
+        self.btn_export_all.clicked.connect(self.export_all)
 
         self.stacked_widget.setCurrentIndex(0)
 
@@ -176,50 +195,107 @@ class MainWindow(QMainWindow):
         self.timer.timeout.connect(self.update_uae_time)
         self.timer.start(1000)
 
+        register_page(self)
+
+    def refresh_texts(self):
+        """切换语言时由 i18n.set_language 调用，只改文字不重建界面"""
+        self.setWindowTitle(tr("title"))
+        self.menu_label.setText(f"<h2 style='color:#fff;font-weight:bold;'>{tr('menu')}</h2>")
+        self.btn_vehicle.setText(tr("vehicle"))
+        self.btn_customer.setText(tr("customer"))
+        self.btn_order.setText(tr("order"))
+        self.btn_fine.setText(tr("fine"))
+        self.btn_lang.setText(tr("lang"))
+        self.btn_backup.setText(tr("backup"))
+        self.btn_export_all.setText(tr("export_all"))
+        self.global_search.setPlaceholderText(tr("global_search_placeholder"))
+        self.update_uae_time()
+
+    def do_global_search(self):
+        text = self.global_search.text().strip()
+        if not text:
+            return
+        dialog = GlobalSearchDialog(text, self)
+        dialog.open_record.connect(lambda entity, rid: self.open_record(entity, rid, text))
+        dialog.exec_()
+
+    def open_record(self, entity, rid, text):
+        """切到对应页面，用同样的关键字搜索，翻到该行所在的页并选中它"""
+        page = {"vehicles": self.vehicle_page, "customers": self.customer_page,
+                "orders": self.order_page, "fines": self.fine_page}[entity]
+        self.stacked_widget.setCurrentWidget(page)
+        if page is self.fine_page:
+            page.show_local()
+        page.search_edit.setText(text)
+        page.do_search()
+        row = page.pager.locate(rid)
+        page.show_page()
+        if row < 0:
+            QMessageBox.information(self, tr("global_search"), tr("record_not_found"))
+            return
+        page.table.selectRow(row)
+        page.table.scrollTo(page.model.index(row, 0))
+
     def update_uae_time(self):
         # 迪拜时区
         try:
             tz = pytz.timezone("Asia/Dubai")
             now = datetime.now(tz)
             time_str = now.strftime("%Y-%m-%d %H:%M:%S")
-            self.time_label.setText(f"🇦🇪 {tr('uae_time') if 'uae_time' in LANG[current_lang] else 'UAE Time'}: {time_str}")
+            self.time_label.setText(f"🇦🇪 {tr('uae_time')}: {time_str}")
         except Exception as e:
             self.time_label.setText("UAE Time: --:--:--")
 
     def switch_language(self):
-        from i18n import LANG, current_lang
-        # 切换语言
-        if current_lang == "zh":
-            import i18n
-            i18n.current_lang = "en"
-        else:
-            import i18n
-            i18n.current_lang = "zh"
+        # 原地切换：各页面和主窗口的 refresh_texts 由 set_language 统一调用
+        i18n.set_language("en" if i18n.current_lang == "zh" else "zh")
         QMessageBox.information(self, tr("lang"), tr("switch_success"))
-        self.reload_ui()
-
-    def reload_ui(self):
-        # 重新加载界面以刷新所有文字
-        self.centralWidget().deleteLater()
-        self.init_ui()
 
     def backup_database(self):
-        db_file = "rental.db"
-        if not os.path.exists(db_file):
-            QMessageBox.warning(self, tr("backup"), "数据库文件不存在！")
+        if not os.path.exists(DB_FILE):
+            QMessageBox.warning(self, tr("backup"), tr("db_not_found"))
+            return
+        if getattr(self, "backup_worker", None) and self.backup_worker.isRunning():
+            self.backup_dialog.show()
             return
         save_path, _ = QFileDialog.getSaveFileName(self, tr("backup"), "rental_backup.db", "Database Files (*.db);;All Files (*)")
         if not save_path:
             return
-        try:
-            shutil.copyfile(db_file, save_path)
-            QMessageBox.information(self, tr("backup"), tr("backup_success"))
-        except Exception as e:
-            QMessageBox.critical(self, tr("backup"), tr("backup_failed") + "\n" + str(e))
+        # 后台线程在线备份，进度框不模态，备份期间可以照常操作
+        self.backup_dialog = QProgressDialog(tr("backup_progress"), tr("cancel"), 0, 100, self)
+        self.backup_dialog.setWindowTitle(tr("backup"))
+        self.backup_dialog.setAutoClose(False)
+        self.backup_dialog.setAutoReset(False)
+        self.backup_worker = BackupWorker(save_path, self)
+        self.backup_worker.progress.connect(self.on_backup_progress)
+        self.backup_worker.succeeded.connect(self.on_backup_succeeded)
+        self.backup_worker.failed.connect(self.on_backup_failed)
+        self.backup_worker.finished.connect(self.backup_dialog.close)
+        self.backup_dialog.canceled.connect(self.backup_worker.requestInterruption)
+        self.backup_dialog.show()
+        self.backup_worker.start()
+
+    def on_backup_progress(self, done, total):
+        self.backup_dialog.setMaximum(max(total, 1))
+        self.backup_dialog.setValue(done)
+
+    def on_backup_succeeded(self, path):
+        QMessageBox.information(self, tr("backup"), tr("backup_success") + "\n" + path)
+
+    def on_backup_failed(self, message):
+        QMessageBox.critical(self, tr("backup"), tr("backup_failed") + "\n" + message)
+
+    def export_all(self):
+        """四个列表各导出一份 CSV，打包成一个 zip"""
+        path, _ = QFileDialog.getSaveFileName(self, tr("export_all"), "rental_export.zip", "Zip Files (*.zip)")
+        if path:
+            start_export(self, path)
+
 
 if __name__ == "__main__":
     import pytz  # 确保已安装 pytz
     app = QApplication(sys.argv)
+    startup()  # 建表/升级、首次导入 JSON，都在窗口创建前显式做一次
     window = MainWindow()
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
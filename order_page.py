@@ -1,39 +1,35 @@
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem,
+    QWidget, QVBoxLayout, QLabel,
     QPushButton, QHBoxLayout, QDialog, QFormLayout, QLineEdit, QComboBox,
-    QDateEdit, QTextEdit, QMessageBox, QFileDialog
+    QDateEdit, QTextEdit, QMessageBox, QFileDialog, QApplication
 )
-from PyQt5.QtCore import QDate, Qt, QTimer
-from PyQt5.QtGui import QBrush, QColor
-import csv
+from PyQt5.QtCore import QDate, Qt, QTimer, QEvent
 
-from data import save_all_data, vehicle_data, customer_data, order_data
+from data import (insert_order, update_order, delete_order, KeysetPager, get_order, has_rows,
+                  expired_order_ids, fmt_num, booking_conflicts, BookingConflictError,
+                  sum_order_amount, ORDER_STATUSES)
 from i18n import tr, register_page
+from widgets import PageBar, LiveSearch, start_export, start_import
+from export import EXPORT_FILE_NAMES
+from table_model import RecordTableModel, make_view, PAGE_SIZE, FETCH_SIZE
 from add_order_dialog import AddOrderDialog
+from scheduler import DueScheduler
 
 
 # ========== 辅助 ==========
-def generate_new_order_id():
-    if not order_data:
-        return 1001
-    return max(int(o.get("id", 0)) for o in order_data) + 1
-
 def find_order_by_id(order_id):
-    for i, o in enumerate(order_data):
-        if str(o.get("id")) == str(order_id):
-            return i, o
-    return None
+    return get_order(int(order_id))
 
 
 # ========== 主页面 ==========
 class OrderPage(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.page_size = 10
-        self.current_page = 1
-        self.search_text = ""
+        self.page_size = PAGE_SIZE
         self.flash_on = True
-        self.sort_reverse = False
+        self.expired_rows = []
+        self.set_today()
+        self.pager = KeysetPager("orders", self.page_size, FETCH_SIZE)
 
         layout = QVBoxLayout(self)
         self.title = QLabel(tr("order_manage"))
@@ -52,6 +48,7 @@ class OrderPage(QWidget):
         search_btn = QPushButton(tr("search"))
         self.search_btn = search_btn
         search_btn.clicked.connect(self.do_search)
+        self.search_edit.returnPressed.connect(self.do_search)
         search_layout.addWidget(self.search_edit)
         search_layout.addWidget(search_btn)
         search_layout.addStretch()
@@ -62,56 +59,61 @@ class OrderPage(QWidget):
         self.btn_add = QPushButton(tr("add_order"))
         self.btn_delete = QPushButton(tr("delete_order"))
         self.btn_export = QPushButton(tr("export_csv"))
+        self.btn_import = QPushButton(tr("import_csv"))
         self.btn_renew = QPushButton(tr("renew_order"))
         btn_layout.addWidget(self.btn_add)
         btn_layout.addWidget(self.btn_delete)
         btn_layout.addWidget(self.btn_export)
+        btn_layout.addWidget(self.btn_import)
         btn_layout.addWidget(self.btn_renew)
         btn_layout.addStretch()
+        self.total_label = QLabel()
+        btn_layout.addWidget(self.total_label)
         layout.addLayout(btn_layout)
 
         # 表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(8)
-        self.table.setHorizontalHeaderLabels([
-            tr("order_id"), tr("customer_name"), tr("vehicle_plate"), tr("start_date"),
-            tr("end_date"), tr("order_status"), tr("total_amount"), tr("remark")
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSortingEnabled(False)
+        self.model = RecordTableModel(self.pager, [
+            ("order_id", lambda o: str(o["id"]), "id"), ("customer_name", lambda o: o["customer"]),
+            ("vehicle_plate", lambda o: o["vehicle"]),
+            ("start_date", lambda o: o["start_date"], "start_date"), ("end_date", lambda o: o["end_date"], "end_date"),
+            ("order_status", lambda o: tr(o["status"]), "status"),
+            ("total_amount", lambda o: fmt_num(o["amount"]), "amount"), ("remark", lambda o: o["remark"], "remark"),
+        ], self.cell_style, self)
+        self.table = make_view(self.model)
         self.table.horizontalHeader().setStretchLastSection(True)
         layout.addWidget(self.table)
 
         # 分页
-        page_layout = QHBoxLayout()
-        self.btn_prev = QPushButton(tr("prev_page"))
-        self.btn_next = QPushButton(tr("next_page"))
-        self.lbl_page = QLabel()
-        page_layout.addStretch()
-        page_layout.addWidget(self.btn_prev)
-        page_layout.addWidget(self.lbl_page)
-        page_layout.addWidget(self.btn_next)
-        page_layout.addStretch()
-        layout.addLayout(page_layout)
+        self.page_bar = PageBar(self.pager)
+        layout.addWidget(self.page_bar)
+        self.live_search = LiveSearch(self.search_edit, self.model, self.page_bar, self)
 
         # 信号绑定
         self.btn_add.clicked.connect(self.add_order)
         self.btn_delete.clicked.connect(self.delete_order)
         self.btn_export.clicked.connect(self.export_csv)
+        self.btn_import.clicked.connect(self.import_csv)
         self.btn_renew.clicked.connect(self.renew_order)
-        self.table.cellDoubleClicked.connect(self.edit_order)
-        self.btn_prev.clicked.connect(self.prev_page)
-        self.btn_next.clicked.connect(self.next_page)
+        self.table.doubleClicked.connect(lambda idx: self.edit_order(idx.row(), idx.column()))
+        self.page_bar.page_changed.connect(self.show_page)
         self.table.horizontalHeader().sectionClicked.connect(self.sort_by_column)
 
-        # 闪烁定时器
+        # 闪烁定时器：只在页面可见、窗口没最小化、且有过期订单时运行
         self.flash_timer = QTimer(self)
+        self.flash_timer.setInterval(600)
         self.flash_timer.timeout.connect(self.toggle_flash)
-        self.flash_timer.start(600)
+        self.model.modelReset.connect(self.collect_expired)
+        self.model.rowsInserted.connect(self.collect_expired)
+
+        # 到期调度：订单跨过"即将到期"/"已过期"时只更新对应的行
+        self.scheduler = DueScheduler(self)
+        self.scheduler.due_soon.connect(self.on_order_due)
+        self.scheduler.expired.connect(self.on_order_expired)
+        self.scheduler.day_changed.connect(self.on_day_changed)
 
         register_page(self)
         self.refresh_table()
+        self.scheduler.load()
 
     # ===== 多语言刷新 =====
     def refresh_texts(self):
@@ -119,145 +121,188 @@ class OrderPage(QWidget):
         self.btn_add.setText(tr("add_order"))
         self.btn_delete.setText(tr("delete_order"))
         self.btn_export.setText(tr("export_csv"))
+        self.btn_import.setText(tr("import_csv"))
         self.btn_renew.setText(tr("renew_order"))
-        self.btn_prev.setText(tr("prev_page"))
-        self.btn_next.setText(tr("next_page"))
+        self.page_bar.refresh_texts()
         self.search_edit.setPlaceholderText(tr("search_order_placeholder"))
         self.search_btn.setText(tr("search"))
-        self.table.setHorizontalHeaderLabels([
-            tr("order_id"), tr("customer_name"), tr("vehicle_plate"), tr("start_date"),
-            tr("end_date"), tr("order_status"), tr("total_amount"), tr("remark")
-        ])
-        self.refresh_table()
+        self.update_remind_label()
+        self.update_total_label()
+        self.model.retranslate()
 
     # ===== 排序逻辑 =====
     def sort_by_column(self, column):
-        self.sort_reverse = not getattr(self, "sort_reverse", False)
-        col_map = {0:"id",1:"customer",2:"vehicle",3:"start_date",4:"end_date",5:"status",6:"amount",7:"remark"}
-        key = col_map.get(column)
+        # Shift+单击表头：在已有排序后面再加一列
+        key = self.model.sort_column(column)
         if not key: return
-        def sort_key(x):
-            val = x.get(key, "")
-            if isinstance(val, str) and val.replace(".","",1).isdigit():
-                try: return float(val)
-                except: return val
-            return str(val).lower()
-        order_data.sort(key=sort_key, reverse=self.sort_reverse)
-        self.refresh_table()
+        self.pager.toggle_sort(key, append=bool(QApplication.keyboardModifiers() & Qt.ShiftModifier))
+        self.show_page()
 
     # ===== 表格刷新 =====
     def refresh_table(self):
-        today = QDate.currentDate().toString("yyyy-MM-dd")
-        expired = [o["id"] for o in order_data if o["end_date"] < today and o["status"] in ["ongoing","overdue"]]
-        self.remind_label.setText(tr("order_expired")+" "+"、".join(map(str,expired)) if expired else "")
-
-        filtered = self.get_filtered_data()
-        total = len(filtered)
-        total_pages = max(1,(total+self.page_size-1)//self.page_size)
-        self.current_page = min(self.current_page, total_pages)
-        start=(self.current_page-1)*self.page_size; end=min(start+self.page_size,total)
-        page_data=filtered[start:end]
-
-        self.table.setRowCount(len(page_data))
-        today_qdate = QDate.currentDate()
-        for row,o in enumerate(page_data):
-            end_qdate=QDate.fromString(o["end_date"],"yyyy-MM-dd")
-            days_to_end=today_qdate.daysTo(end_qdate)
-            is_expired=end_qdate.isValid() and end_qdate<today_qdate and o["status"] in ["ongoing","overdue"]
-            is_soon=end_qdate.isValid() and 0<=days_to_end<=3 and o["status"] in ["ongoing","overdue"]
-            values=[str(o["id"]),o["customer"],o["vehicle"],o["start_date"],o["end_date"],tr(o["status"]),o["amount"],o["remark"]]
-            for col,val in enumerate(values):
-                item=QTableWidgetItem(val)
-                if col==4:
-                    if is_expired:
-                        if self.flash_on:
-                            item.setBackground(QBrush(QColor("#ff4d4f"))); item.setForeground(QBrush(QColor("#ffffff")))
-                        else:
-                            item.setBackground(QBrush(QColor("#ffffff"))); item.setForeground(QBrush(QColor("#ff4d4f")))
-                    elif is_soon:
-                        item.setBackground(QBrush(QColor("#fff566"))); item.setForeground(QBrush(QColor("#000000")))
-                if o["status"]=="ongoing":
-                    item.setBackground(QBrush(QColor("#d4f4dd")))
-                elif o["status"]=="overdue":
-                    item.setBackground(QBrush(QColor("#ffccc7")))
-                elif o["status"]=="cancelled":
-                    item.setBackground(QBrush(QColor("#d9d9d9"))); item.setForeground(QBrush(QColor("#888888")))
-                self.table.setItem(row,col,item)
-        self.lbl_page.setText(tr("page_info").format(self.current_page,total_pages,total))
-        self.btn_prev.setEnabled(self.current_page>1)
-        self.btn_next.setEnabled(self.current_page<total_pages)
+        self.set_today()
+        self.expired_ids = expired_order_ids(self.today)
+        self.update_remind_label()
+        self.update_total_label()
+
+        self.pager.reload()
+        self.model.refresh()
+        self.collect_expired()
+        self.page_bar.update_state()
+
+    def show_page(self):
+        self.model.reset()
+        self.page_bar.update_state()
+
+    def set_today(self):
+        today = QDate.currentDate()
+        self.today = today.toString("yyyy-MM-dd")
+        self.soon_limit = today.addDays(3).toString("yyyy-MM-dd")
+
+    def is_expired(self,o):
+        return bool(o["end_date"]) and o["end_date"]<self.today and o["status"] in ("ongoing","overdue")
+
+    def cell_style(self,o,col):
+        """结束日期列：已过期红色闪烁、3 天内到期黄色；其余按订单状态给整行上色"""
+        if col==4 and o["end_date"] and o["status"] in ("ongoing","overdue"):
+            if self.is_expired(o):
+                return ("#ff4d4f","#ffffff") if self.flash_on else ("#ffffff","#ff4d4f")
+            if o["end_date"]<=self.soon_limit:
+                return "#fff566","#000000"
+        if o["status"]=="ongoing":
+            return "#d4f4dd",None
+        if o["status"]=="overdue":
+            return "#ffccc7",None
+        if o["status"]=="cancelled":
+            return "#d9d9d9","#888888"
+        return None,None
+
+    def update_remind_label(self):
+        self.remind_label.setText(tr("order_expired")+" "+"、".join(map(str,self.expired_ids)) if self.expired_ids else "")
+
+    def update_total_label(self):
+        # 金额合计直接在 SQLite 里算，不含已取消的订单
+        billed=[s for s in ORDER_STATUSES if s!="cancelled"]
+        self.total_label.setText(tr("order_amount_total").format(fmt_num(sum_order_amount(billed))))
+
+    # ===== 到期调度 =====
+    def on_order_due(self,order_id):
+        self.model.refresh_row(self.model.row_of(order_id))
+
+    def on_order_expired(self,order_id):
+        if order_id not in self.expired_ids:
+            self.expired_ids.append(order_id)
+            self.update_remind_label()
+        row=self.model.row_of(order_id)
+        if row>=0:
+            self.model.refresh_row(row)
+            self.expired_rows.append(row)
+            self.update_flash_timer()
+
+    def on_day_changed(self,today):
+        # 单元格颜色按新的日期判断；跨过阈值的行由 due_soon/expired 信号逐行刷新
+        self.set_today()
+
+    # ===== 过期闪烁 =====
+    def collect_expired(self):
+        """记下已读入的行里哪些需要闪烁"""
+        self.expired_rows=[i for i,o in enumerate(self.model.rows) if self.is_expired(o)]
+        self.update_flash_timer()
+
+    def update_flash_timer(self):
+        active=bool(self.expired_rows) and self.isVisible() and not self.window().isMinimized()
+        if active and not self.flash_timer.isActive():
+            self.flash_timer.start()
+        elif not active and self.flash_timer.isActive():
+            self.flash_timer.stop()
+            if not self.flash_on:
+                self.toggle_flash()  # 停在醒目的红底状态
 
-    # ===== 基础逻辑 =====
     def toggle_flash(self):
-        self.flash_on=not self.flash_on; self.refresh_table()
+        """只让视口里过期行的结束日期格重画，不重新取数"""
+        self.flash_on=not self.flash_on
+        first=self.table.rowAt(0)
+        if first<0:return
+        last=self.table.rowAt(self.table.viewport().height()-1)
+        if last<0:last=self.model.rowCount()-1
+        self.model.refresh_column(4,[r for r in self.expired_rows if first<=r<=last])
 
-    def do_search(self):
-        self.search_text=self.search_edit.text().strip(); self.current_page=1; self.refresh_table()
+    def showEvent(self,event):
+        super().showEvent(event)
+        self.window().installEventFilter(self)  # 重复安装只会生效一次
+        self.update_flash_timer()
 
-    def get_filtered_data(self):
-        if not self.search_text: return order_data
-        return [o for o in order_data if self.search_text.lower() in o["customer"].lower() 
-                or self.search_text.lower() in o["vehicle"].lower()
-                or self.search_text.lower() in o["status"].lower()]
+    def hideEvent(self,event):
+        super().hideEvent(event)
+        self.update_flash_timer()
+
+    def eventFilter(self,obj,event):
+        if event.type()==QEvent.WindowStateChange:
+            self.update_flash_timer()
+        return super().eventFilter(obj,event)
+
+    # ===== 基础逻辑 =====
+
+    def do_search(self):
+        self.live_search.cancel()
+        self.pager.set_query(search=self.search_edit.text().strip()); self.show_page()
 
     def get_selected_order(self,row):
-        item=self.table.item(row,0)
-        if not item:return None
-        return find_order_by_id(item.text())
+        o=self.model.record(row)
+        if not o:return None
+        return find_order_by_id(o["id"])
 
     # ===== CRUD =====
     def add_order(self):
-        if not customer_data or not vehicle_data:
+        if not has_rows("customers") or not has_rows("vehicles"):
             QMessageBox.warning(self,tr("tip"),tr("add_customer_vehicle_first"));return
         dialog=AddOrderDialog(self)
         if dialog.exec_():
             data=dialog.get_data()
-            if not data["customer"] or not data["vehicle"]:
+            if data["customer_id"] is None or data["vehicle_id"] is None:
                 QMessageBox.warning(self,tr("tip"),tr("customer_vehicle_required"));return
             if data["start_date"] > data["end_date"]:
                 QMessageBox.warning(self,tr("tip"),tr("date_invalid"));return
             try: float(data["amount"])
             except ValueError:
                 QMessageBox.warning(self,tr("tip"),tr("amount_invalid"));return
-            for k in ["ongoing","completed","overdue","cancelled"]:
-                if data["status"]==tr(k): data["status"]=k
-            data["id"]=generate_new_order_id()
-            order_data.append(data); save_all_data(); self.refresh_table()
+            try: insert_order(data)
+            except BookingConflictError:
+                self.warn_booked(data);return
+            self.scheduler.track(data["id"],data["end_date"],data["status"]); self.refresh_table()
 
     def delete_order(self):
-        row=self.table.currentRow()
+        row=self.table.currentIndex().row()
         if row==-1: QMessageBox.warning(self,tr("tip"),tr("select_order")); return
-        result=self.get_selected_order(row)
-        if not result:return
-        idx,order=result
+        order=self.get_selected_order(row)
+        if not order:return
         reply=QMessageBox.question(self,tr("delete_order"),tr("confirm_delete_order").format(order["id"]),QMessageBox.Yes|QMessageBox.No)
-        if reply==QMessageBox.Yes: del order_data[idx]; save_all_data(); self.refresh_table()
+        if reply==QMessageBox.Yes: delete_order(order["id"]); self.refresh_table()
 
     def edit_order(self,row,column):
-        result=self.get_selected_order(row)
-        if not result:return
-        idx,order=result
+        order=self.get_selected_order(row)
+        if not order:return
         dialog=AddOrderDialog(self,order)
         if dialog.exec_():
             new_data=dialog.get_data()
-            if not new_data["customer"] or not new_data["vehicle"]:
+            if new_data["customer_id"] is None or new_data["vehicle_id"] is None:
                 QMessageBox.warning(self,tr("tip"),tr("customer_vehicle_required"));return
             if new_data["start_date"]>new_data["end_date"]:
                 QMessageBox.warning(self,tr("tip"),tr("date_invalid"));return
             try: float(new_data["amount"])
             except ValueError:
                 QMessageBox.warning(self,tr("tip"),tr("amount_invalid"));return
-            for k in ["ongoing","completed","overdue","cancelled"]:
-                if new_data["status"]==tr(k): new_data["status"]=k
             new_data["id"]=order["id"]
-            order_data[idx]=new_data; save_all_data(); self.refresh_table()
+            try: update_order(new_data)
+            except BookingConflictError:
+                self.warn_booked(new_data);return
+            self.scheduler.track(new_data["id"],new_data["end_date"],new_data["status"]); self.refresh_table()
 
     def renew_order(self):
-        row=self.table.currentRow()
+        row=self.table.currentIndex().row()
         if row==-1: QMessageBox.warning(self,tr("tip"),tr("select_order")); return
-        result=self.get_selected_order(row)
-        if not result:return
-        idx,order=result
+        order=self.get_selected_order(row)
+        if not order:return
         dialog=QDialog(self); dialog.setWindowTitle(tr("renew_order"))
         layout=QFormLayout(dialog)
         new_end=QDateEdit(); new_end.setCalendarPopup(True)
@@ -270,23 +315,26 @@ class OrderPage(QWidget):
             if new_end_date<=order["end_date"]:
                 QMessageBox.warning(self,tr("tip"),tr("renew_date_error")); return
             order["end_date"]=new_end_date; order["status"]="ongoing"
-            save_all_data(); self.refresh_table()
+            try: update_order(order)
+            except BookingConflictError:
+                self.warn_booked(order);return
+            self.scheduler.track(order["id"],order["end_date"],order["status"]); self.refresh_table()
+
+    def warn_booked(self,o):
+        """同一辆车这段时间已有订单：列出占用它的订单号"""
+        ids=booking_conflicts(o["vehicle_id"],o["start_date"],o["end_date"],o.get("id"))
+        QMessageBox.warning(self,tr("tip"),tr("vehicle_booked").format(", ".join(map(str,ids))))
 
     # ===== 分页 & 导出 =====
-    def prev_page(self):
-        if self.current_page>1:self.current_page-=1; self.refresh_table()
-    def next_page(self):
-        total=len(self.get_filtered_data()); total_pages=max(1,(total+self.page_size-1)//self.page_size)
-        if self.current_page<total_pages:self.current_page+=1; self.refresh_table()
     def export_csv(self):
-        path,_=QFileDialog.getSaveFileName(self,tr("export_csv"),"订单列表.csv","CSV Files (*.csv)")
+        path,_=QFileDialog.getSaveFileName(self,tr("export_csv"),EXPORT_FILE_NAMES["orders"],"CSV Files (*.csv)")
         if not path:return
-        try:
-            with open(path,"w",newline='',encoding="utf-8-sig") as f:
-                writer=csv.writer(f)
-                writer.writerow([tr("order_id"),tr("customer_name"),tr("vehicle_plate"),tr("start_date"),tr("end_date"),tr("order_status"),tr("total_amount"),tr("remark")])
-                for o in self.get_filtered_data():
-                    writer.writerow([o["id"],o["customer"],o["vehicle"],o["start_date"],o["end_date"],tr(o["status"]),o["amount"],o["remark"]])
-            QMessageBox.information(self,tr("export_csv"),tr("export_success"))
-        except Exception as e:
-            QMessageBox.critical(self,tr("export_csv"),tr("export_failed")+"\n"+str(e))
\ No newline at end of file
+        start_export(self,path,"orders",self.pager.search,self.pager.sort)
+
+    def import_csv(self):
+        path,_=QFileDialog.getOpenFileName(self,tr("import_csv"),"","CSV Files (*.csv)")
+        if not path:return
+        start_import(self,path,"orders",self.after_import)
+
+    def after_import(self):
+        self.scheduler.load(); self.refresh_table()
\ No newline at end of file
@@ -0,0 +1,72 @@
+# scheduler.py —— 订单到期提醒：(日期, 订单) 小顶堆，只在下一个到点时刻醒来，不轮询全表
+
+import heapq
+from PyQt5.QtCore import QObject, QTimer, QDate, QDateTime, QTime, pyqtSignal
+from data import active_order_due_dates, order_due_states
+
+SOON_DAYS = 3                           # 结束前几天算"即将到期"
+ACTIVE_STATUSES = ("ongoing", "overdue")
+
+
+class DueScheduler(QObject):
+    """每个进行中/逾期订单在堆里有两个时间点：结束前 SOON_DAYS 天（即将到期）和结束后一天（已过期）。
+    到点时核对订单是否还是原来的结束日期和状态，再发信号；零点另发 day_changed"""
+    due_soon = pyqtSignal(int)      # 订单号
+    expired = pyqtSignal(int)       # 订单号
+    day_changed = pyqtSignal(str)   # 新的日期 'yyyy-MM-dd'
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.today = QDate.currentDate()
+        self._heap = []             # (到点日期, 类型, 订单号, 结束日期)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._wake)
+
+    def load(self):
+        """启动时从库里装入；已经过了的时间点不再触发（页面打开时已按当天状态显示）"""
+        self.today = QDate.currentDate()
+        self._heap = []
+        for order_id, end_date in active_order_due_dates(self.today.toString("yyyy-MM-dd")):
+            self._push(order_id, end_date)
+        self._arm()
+
+    def track(self, order_id, end_date, status):
+        """新增/修改/续租订单后调用；旧的时间点到时会因结束日期不符被丢弃"""
+        if status in ACTIVE_STATUSES:
+            self._push(order_id, end_date)
+            self._arm()
+
+    def _push(self, order_id, end_date):
+        end = QDate.fromString(end_date, "yyyy-MM-dd")
+        if not end.isValid():
+            return
+        for when, kind in ((end.addDays(-SOON_DAYS), "soon"), (end.addDays(1), "expired")):
+            if when > self.today:
+                heapq.heappush(self._heap, (when.toString("yyyy-MM-dd"), kind, order_id, end_date))
+
+    def _arm(self):
+        """定到下一个到点日期和明天零点中较早的一个"""
+        now = QDateTime.currentDateTime()
+        target = QDateTime(now.date().addDays(1), QTime(0, 0))
+        if self._heap:
+            first = QDateTime(QDate.fromString(self._heap[0][0], "yyyy-MM-dd"), QTime(0, 0))
+            target = min(target, first)
+        self._timer.start(max(1000, now.msecsTo(target) + 500))
+
+    def _wake(self):
+        today = QDate.currentDate()
+        if today != self.today:
+            self.today = today
+            self.day_changed.emit(today.toString("yyyy-MM-dd"))
+        key = today.toString("yyyy-MM-dd")
+        due = []
+        while self._heap and self._heap[0][0] <= key:
+            due.append(heapq.heappop(self._heap))
+        if due:
+            states = order_due_states({order_id for _, _, order_id, _ in due})
+            for _, kind, order_id, end_date in due:
+                state = states.get(order_id)
+                if state and state[0] == end_date and state[1] in ACTIVE_STATUSES:
+                    (self.expired if kind == "expired" else self.due_soon).emit(order_id)
+        self._arm()
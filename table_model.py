@@ -0,0 +1,191 @@
+# table_model.py —— 各管理页面表格用的 Qt 模型：数据来自 data.KeysetPager，按需读入
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QPersistentModelIndex, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+from PyQt5.QtWidgets import QTableView, QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+from i18n import tr
+
+PAGE_SIZE = 500     # 每页行数
+FETCH_SIZE = 100    # 每次滚动到底时读入的行数
+
+_brushes = {}
+
+
+def brush(color):
+    """同一种颜色只建一次 QBrush"""
+    if color not in _brushes:
+        _brushes[color] = QBrush(QColor(color))
+    return _brushes[color]
+
+
+class RecordTableModel(QAbstractTableModel):
+    """columns: [(表头 i18n key, 取显示文本的函数 row -> str[, 排序用的数据列])]，没给数据列的列不能排序；
+    style: 可选 (row, 列号) -> (背景色, 前景色)，颜色为 '#rrggbb' 或 None"""
+
+    def __init__(self, pager, columns, style=None, parent=None):
+        super().__init__(parent)
+        self.pager = pager
+        self.columns = columns
+        self.style = style
+        self.rows = []
+        self.streaming = False  # 后台搜索还在往分页器里送行，这时不自己去读
+
+    # ===== 数据装载 =====
+    def reset(self):
+        """翻页、排序、搜索之后整体换一批行"""
+        self.beginResetModel()
+        self.rows = list(self.pager.rows)
+        self.endResetModel()
+
+    def refresh(self):
+        """增删改之后：行的 id 顺序没变时只通知内容变了的行，否则整体重置"""
+        new_rows = list(self.pager.rows)
+        if [r["id"] for r in new_rows] != [r["id"] for r in self.rows]:
+            self.beginResetModel()
+            self.rows = new_rows
+            self.endResetModel()
+            return
+        old_rows, self.rows = self.rows, new_rows
+        start = None
+        for i, (old, new) in enumerate(zip(old_rows + [None], new_rows + [None])):
+            changed = old is not None and old != new
+            if changed and start is None:
+                start = i
+            elif not changed and start is not None:
+                self.dataChanged.emit(self.index(start, 0), self.index(i - 1, len(self.columns) - 1))
+                start = None
+
+    def sync_rows(self):
+        """分页器里多出来的行（后台搜索新送到的）接到表格末尾"""
+        added = self.pager.rows[len(self.rows):]
+        if not added:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(added) - 1)
+        self.rows += added
+        self.endInsertRows()
+
+    def refresh_row(self, row):
+        """某一行的显示条件变了（数据本身没变），让整行重画"""
+        if 0 <= row < len(self.rows):
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+
+    def refresh_column(self, column, rows=None, roles=(Qt.BackgroundRole, Qt.ForegroundRole)):
+        """只让某一列（或其中几行）重画，不重新取数"""
+        for r in (range(len(self.rows)) if rows is None else rows):
+            idx = self.index(r, column)
+            self.dataChanged.emit(idx, idx, list(roles))
+
+    def retranslate(self):
+        """切换语言：表头和翻译过的单元格重画即可"""
+        self.headerDataChanged.emit(Qt.Horizontal, 0, len(self.columns) - 1)
+        if self.rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.rows) - 1, len(self.columns) - 1),
+                                  [Qt.DisplayRole])
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return (not parent.isValid() and not self.streaming
+                and len(self.rows) == len(self.pager.rows) and self.pager.has_more)
+
+    def fetchMore(self, parent=QModelIndex()):
+        added = self.pager.more()
+        if not added:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(added) - 1)
+        self.rows += added
+        self.endInsertRows()
+
+    def sort_column(self, section):
+        """表头第 section 列对应的排序数据列，不能排序时为 None"""
+        spec = self.columns[section]
+        return spec[2] if len(spec) > 2 else None
+
+    # ===== 查询 =====
+    def record(self, row):
+        """第 row 行对应的数据字典"""
+        return self.rows[row] if 0 <= row < len(self.rows) else None
+
+    def row_of(self, row_id):
+        for i, r in enumerate(self.rows):
+            if r["id"] == row_id:
+                return i
+        return -1
+
+    # ===== QAbstractTableModel 接口 =====
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            text = tr(self.columns[section][0])
+            # 排序标记画在文字里：QHeaderView 自带的指示器只能标一列；多列时加上优先级序号
+            sort = self.pager.sort
+            for i, (column, desc) in enumerate(sort):
+                if column == self.sort_column(section):
+                    text += (" ▼" if desc else " ▲") + (str(i + 1) if len(sort) > 1 else "")
+            return text
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return self.columns[index.column()][1](row)
+        if role in (Qt.BackgroundRole, Qt.ForegroundRole) and self.style:
+            colors = self.style(row, index.column())
+            color = colors[0] if role == Qt.BackgroundRole else colors[1]
+            return brush(color) if color else None
+        return None
+
+
+class ButtonDelegate(QStyledItemDelegate):
+    """把一列画成按钮（文字取自模型），不给每行建 QPushButton；点击时发出 clicked(行号)"""
+    clicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pressed = QPersistentModelIndex()
+
+    def _button_rect(self, option):
+        return option.rect.adjusted(4, 2, -4, -2)
+
+    def paint(self, painter, option, index):
+        btn = QStyleOptionButton()
+        btn.rect = self._button_rect(option)
+        btn.text = index.data(Qt.DisplayRole) or ""
+        btn.state = QStyle.State_Enabled | (QStyle.State_Sunken if index == self.pressed else QStyle.State_Raised)
+        if option.state & QStyle.State_MouseOver:
+            btn.state |= QStyle.State_MouseOver
+        widget = option.widget
+        style = widget.style() if widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, btn, painter, widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonPress and event.button() == Qt.LeftButton:
+            if self._button_rect(option).contains(event.pos()):
+                self.pressed = QPersistentModelIndex(index)
+                return True
+        elif event.type() == QEvent.MouseButtonRelease and self.pressed.isValid():
+            hit = index == self.pressed and self._button_rect(option).contains(event.pos())
+            self.pressed = QPersistentModelIndex()
+            if hit:
+                self.clicked.emit(index.row())
+            return True
+        elif event.type() == QEvent.MouseButtonDblClick:
+            return True     # 双击按钮不当作双击整行
+        return super().editorEvent(event, model, option, index)
+
+
+def make_view(model):
+    """按各页面统一的设置建一个 QTableView"""
+    view = QTableView()
+    view.setModel(model)
+    view.setSelectionBehavior(QTableView.SelectRows)
+    view.setSelectionMode(QTableView.SingleSelection)
+    view.setEditTriggers(QTableView.NoEditTriggers)
+    view.setSortingEnabled(False)
+    view.verticalHeader().setDefaultSectionSize(28)
+    return view
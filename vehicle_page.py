@@ -1,24 +1,21 @@
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem,
-    QPushButton, QHBoxLayout, QDialog, QFormLayout, QLineEdit, QDateEdit, QTextEdit, QMessageBox, QFileDialog
+    QWidget, QVBoxLayout, QLabel,
+    QPushButton, QHBoxLayout, QDialog, QFormLayout, QLineEdit, QDateEdit, QTextEdit, QMessageBox, QFileDialog, QApplication
 )
-from PyQt5.QtCore import QDate
-from PyQt5.QtGui import QColor, QBrush
-import csv
+from PyQt5.QtCore import QDate, Qt
 from i18n import tr, register_page
-from data import save_all_data, vehicle_data
+from widgets import PageBar, LiveSearch, start_export, start_import
+from export import EXPORT_FILE_NAMES
+from table_model import RecordTableModel, make_view, PAGE_SIZE, FETCH_SIZE
+from data import (insert_vehicle, update_vehicle, delete_vehicle, KeysetPager, get_vehicle,
+                  DuplicateError, insurance_expiry, count_dependents, ReferencedError, fmt_num)
 
-# ========== 辅助 ==========
-def generate_new_vehicle_id():
-    if not vehicle_data:
-        return 1
-    return max(int(v.get("id", 0)) for v in vehicle_data) + 1
+INSURANCE_WARN_DAYS = 3   # 保险到期前几天开始提醒
+EXPIRY_PLATES_SHOWN = 10  # 提醒面板里最多列出的车牌数
 
+# ========== 辅助 ==========
 def find_vehicle_by_id(vid):
-    for i, v in enumerate(vehicle_data):
-        if str(v.get("id")) == str(vid):
-            return i, v
-    return None
+    return get_vehicle(int(vid))
 
 # ========== 新增/编辑对话框 ==========
 class AddVehicleDialog(QDialog):
@@ -56,11 +53,11 @@ class AddVehicleDialog(QDialog):
             self.vid = data.get("id")
             self.plate_number.setText(data["plate"])
             self.model.setText(data["model"])
-            self.year.setText(data["year"])
+            self.year.setText(fmt_num(data["year"]))
             self.insurance_date.setDate(QDate.fromString(data["insurance"], "yyyy-MM-dd"))
-            self.mileage.setText(data["mileage"])
-            self.monthly_price.setText(data["monthly_price"])
-            self.deposit.setText(data["deposit"])
+            self.mileage.setText(fmt_num(data["mileage"]))
+            self.monthly_price.setText(fmt_num(data["monthly_price"]))
+            self.deposit.setText(fmt_num(data["deposit"]))
             self.remark.setPlainText(data["remark"])
 
     def get_data(self):
@@ -80,19 +77,26 @@ class AddVehicleDialog(QDialog):
 class VehiclePage(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.page_size = 10
-        self.current_page = 1
-        self.search_text = ""
-        self.sort_reverse = False
+        self.page_size = PAGE_SIZE
+        self.set_today()
+        self.pager = KeysetPager("vehicles", self.page_size, FETCH_SIZE)
 
         layout = QVBoxLayout(self)
         self.title = QLabel(tr("vehicle_manage"))
         self.title.setStyleSheet("font-size: 22px; font-weight: bold;")
         layout.addWidget(self.title)
 
-        self.remind_label = QLabel()
-        self.remind_label.setStyleSheet("color: red; font-weight: bold;")
-        layout.addWidget(self.remind_label)
+        # 保险到期提醒面板：已过期 / 即将到期 的数量和车牌
+        expiry_layout = QHBoxLayout()
+        self.expired_label = QLabel()
+        self.expired_label.setStyleSheet("background:#ff4d4f; color:#fff; font-weight:bold; border-radius:6px; padding:4px 10px;")
+        self.soon_label = QLabel()
+        self.soon_label.setStyleSheet("background:#fff566; color:#000; font-weight:bold; border-radius:6px; padding:4px 10px;")
+        for lbl in (self.expired_label, self.soon_label):
+            lbl.setWordWrap(True)
+            expiry_layout.addWidget(lbl)
+        expiry_layout.addStretch()
+        layout.addLayout(expiry_layout)
 
         # 搜索
         search_layout = QHBoxLayout()
@@ -101,6 +105,7 @@ class VehiclePage(QWidget):
         search_btn = QPushButton(tr("search"))
         self.search_btn = search_btn
         search_btn.clicked.connect(self.do_search)
+        self.search_edit.returnPressed.connect(self.do_search)
         search_layout.addWidget(self.search_edit)
         search_layout.addWidget(search_btn)
         search_layout.addStretch()
@@ -111,41 +116,38 @@ class VehiclePage(QWidget):
         self.btn_add = QPushButton(tr("add_vehicle"))
         self.btn_delete = QPushButton(tr("delete_vehicle"))
         self.btn_export = QPushButton(tr("export_csv"))
+        self.btn_import = QPushButton(tr("import_csv"))
         btn_layout.addWidget(self.btn_add)
         btn_layout.addWidget(self.btn_delete)
         btn_layout.addWidget(self.btn_export)
+        btn_layout.addWidget(self.btn_import)
         btn_layout.addStretch()
         layout.addLayout(btn_layout)
 
         # 表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(8)
-        self.table.setHorizontalHeaderLabels([
-            tr("vehicle_id"), tr("license_plate"), tr("model"), tr("year"), 
-            tr("insurance_expiry"), tr("mileage"), tr("monthly_price"), tr("deposit")
-        ])
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSortingEnabled(False)
+        self.model = RecordTableModel(self.pager, [
+            ("vehicle_id", lambda v: str(v["id"]), "id"), ("license_plate", lambda v: v["plate"], "plate"),
+            ("model", lambda v: v["model"], "model"), ("year", lambda v: fmt_num(v["year"]), "year"),
+            ("insurance_expiry", lambda v: v["insurance"], "insurance"),
+            ("mileage", lambda v: fmt_num(v["mileage"]), "mileage"),
+            ("monthly_price", lambda v: fmt_num(v["monthly_price"]), "monthly_price"),
+            ("deposit", lambda v: fmt_num(v["deposit"]), "deposit"),
+        ], self.cell_style, self)
+        self.table = make_view(self.model)
         layout.addWidget(self.table)
 
         # 分页
-        page_layout = QHBoxLayout()
-        self.btn_prev = QPushButton(tr("prev_page"))
-        self.btn_next = QPushButton(tr("next_page"))
-        self.lbl_page = QLabel()
-        page_layout.addStretch()
-        page_layout.addWidget(self.btn_prev); page_layout.addWidget(self.lbl_page); page_layout.addWidget(self.btn_next)
-        page_layout.addStretch()
-        layout.addLayout(page_layout)
+        self.page_bar = PageBar(self.pager)
+        layout.addWidget(self.page_bar)
+        self.live_search = LiveSearch(self.search_edit, self.model, self.page_bar, self)
 
         # 信号
         self.btn_add.clicked.connect(self.add_vehicle)
         self.btn_delete.clicked.connect(self.delete_vehicle)
         self.btn_export.clicked.connect(self.export_csv)
-        self.table.cellDoubleClicked.connect(self.edit_vehicle)
-        self.btn_prev.clicked.connect(self.prev_page)
-        self.btn_next.clicked.connect(self.next_page)
+        self.btn_import.clicked.connect(self.import_csv)
+        self.table.doubleClicked.connect(lambda idx: self.edit_vehicle(idx.row(), idx.column()))
+        self.page_bar.page_changed.connect(self.show_page)
         self.table.horizontalHeader().sectionClicked.connect(self.sort_by_column)
 
         register_page(self)
@@ -157,68 +159,68 @@ class VehiclePage(QWidget):
         self.btn_add.setText(tr("add_vehicle"))
         self.btn_delete.setText(tr("delete_vehicle"))
         self.btn_export.setText(tr("export_csv"))
-        self.btn_prev.setText(tr("prev_page"))
-        self.btn_next.setText(tr("next_page"))
+        self.btn_import.setText(tr("import_csv"))
+        self.page_bar.refresh_texts()
         self.search_edit.setPlaceholderText(tr("search_placeholder"))
         self.search_btn.setText(tr("search"))
-        self.table.setHorizontalHeaderLabels([
-            tr("vehicle_id"), tr("license_plate"), tr("model"), tr("year"), 
-            tr("insurance_expiry"), tr("mileage"), tr("monthly_price"), tr("deposit")
-        ])
-        self.refresh_table()
+        self.show_expiry_panel()
+        self.model.retranslate()
 
     # ===== 排序 =====
     def sort_by_column(self, column):
-        self.sort_reverse = not getattr(self, "sort_reverse", False)
-        col_map = {0:"id",1:"plate",2:"model",3:"year",4:"insurance",5:"mileage",6:"monthly_price",7:"deposit"}
-        key = col_map.get(column)
+        # Shift+单击表头：在已有排序后面再加一列
+        key = self.model.sort_column(column)
         if not key: return
-        def sort_key(x):
-            val = x.get(key, "")
-            if isinstance(val,str) and val.isdigit(): return int(val)
-            return str(val).lower()
-        vehicle_data.sort(key=sort_key, reverse=self.sort_reverse)
-        self.refresh_table()
+        self.pager.toggle_sort(key, append=bool(QApplication.keyboardModifiers() & Qt.ShiftModifier))
+        self.show_page()
 
     # ===== 搜索 =====
     def do_search(self):
-        self.search_text = self.search_edit.text().strip()
-        self.current_page=1
-        self.refresh_table()
-
-    def get_filtered_data(self):
-        if not self.search_text: return vehicle_data
-        return [v for v in vehicle_data if self.search_text.lower() in v["plate"].lower() or self.search_text.lower() in v["model"].lower()]
+        self.live_search.cancel()
+        self.pager.set_query(search=self.search_edit.text().strip())
+        self.show_page()
 
     def get_selected_vehicle(self,row):
-        item=self.table.item(row,0)
-        if not item:return None
-        vid=item.text()
-        return find_vehicle_by_id(vid)
+        v=self.model.record(row)
+        if not v:return None
+        return find_vehicle_by_id(v["id"])
 
     def refresh_table(self):
+        self.set_today()
+        self.update_expiry_panel()
+        self.pager.reload()
+        self.model.refresh()
+        self.page_bar.update_state()
+
+    def show_page(self):
+        self.model.reset()
+        self.page_bar.update_state()
+
+    def set_today(self):
         today = QDate.currentDate()
-        expired = [v["plate"] for v in vehicle_data if QDate.fromString(v["insurance"],"yyyy-MM-dd")<today]
-        self.remind_label.setText(tr("insurance_expired")+" "+"、".join(expired) if expired else "")
-        filtered=self.get_filtered_data()
-        total=len(filtered); total_pages=max(1,(total+self.page_size-1)//self.page_size)
-        self.current_page=min(self.current_page,total_pages)
-        start=(self.current_page-1)*self.page_size; end=min(start+self.page_size,total)
-        page_data=filtered[start:end]
-        self.table.setRowCount(len(page_data))
-        for row,v in enumerate(page_data):
-            values=[str(v.get("id","")),v["plate"],v["model"],v["year"],v["insurance"],v["mileage"],v["monthly_price"],v["deposit"]]
-            for col,val in enumerate(values):
-                item=QTableWidgetItem(val)
-                if col==4:
-                    ins_qdate=QDate.fromString(v["insurance"],"yyyy-MM-dd")
-                    if ins_qdate<today:
-                        item.setBackground(QBrush(QColor("#ff4d4f"))); item.setForeground(QBrush(QColor("#ffffff")))
-                self.table.setItem(row,col,item)
-
-        self.lbl_page.setText(tr("page_info").format(self.current_page,total_pages,total))
-        self.btn_prev.setEnabled(self.current_page>1)
-        self.btn_next.setEnabled(self.current_page<total_pages)
+        self.today = today.toString("yyyy-MM-dd")
+        self.soon_limit = today.addDays(INSURANCE_WARN_DAYS).toString("yyyy-MM-dd")
+
+    def update_expiry_panel(self):
+        self.expiry=insurance_expiry(self.today,self.soon_limit,EXPIRY_PLATES_SHOWN)
+        self.show_expiry_panel()
+
+    def show_expiry_panel(self):
+        n_expired,expired,n_soon,soon=self.expiry
+        for lbl,n,plates,text in ((self.expired_label,n_expired,expired,tr("insurance_expired_count").format(n_expired)),
+                                  (self.soon_label,n_soon,soon,tr("insurance_soon_count").format(n_soon,INSURANCE_WARN_DAYS))):
+            more=" "+tr("and_more").format(n) if n>len(plates) else ""
+            lbl.setText(text+"："+"、".join(plates)+more)
+            lbl.setVisible(n>0)
+
+    def cell_style(self,v,col):
+        # 保险已过期：红底白字；即将到期：黄底
+        if col==4 and v["insurance"]:
+            if v["insurance"]<self.today:
+                return "#ff4d4f","#ffffff"
+            if v["insurance"]<=self.soon_limit:
+                return "#fff566","#000000"
+        return None,None
 
     # ===== CRUD =====
     def add_vehicle(self):
@@ -229,26 +231,38 @@ class VehiclePage(QWidget):
                 QMessageBox.warning(self,tr("tip"),tr("plate_required"));return
             if not data["year"].isdigit():
                 QMessageBox.warning(self,tr("tip"),tr("year_number"));return
-            if any(v["plate"]==data["plate"] for v in vehicle_data):
+            try: insert_vehicle(data)
+            except DuplicateError:
                 QMessageBox.warning(self,tr("tip"),tr("plate_exists"));return
-            data["id"]=generate_new_vehicle_id()
-            vehicle_data.append(data); save_all_data(); self.refresh_table()
+            self.refresh_table()
 
     def delete_vehicle(self):
-        row=self.table.currentRow()
+        row=self.table.currentIndex().row()
         if row==-1:
             QMessageBox.warning(self,tr("tip"),tr("select_vehicle"));return
-        result=self.get_selected_vehicle(row)
-        if not result:return
-        idx,vehicle=result
-        reply=QMessageBox.question(self,tr("delete_vehicle"),tr("confirm_delete").format(vehicle["plate"]),QMessageBox.Yes|QMessageBox.No)
+        vehicle=self.get_selected_vehicle(row)
+        if not vehicle:return
+        if self.warn_referenced(vehicle):return
+        msg=tr("confirm_delete").format(vehicle["plate"])
+        reply=QMessageBox.question(self,tr("delete_vehicle"),msg,QMessageBox.Yes|QMessageBox.No)
         if reply==QMessageBox.Yes:
-            del vehicle_data[idx]; save_all_data(); self.refresh_table()
+            try:
+                delete_vehicle(vehicle["id"])
+            except ReferencedError:
+                # 确认期间（如后台导入）又有订单或罚款引用了它
+                self.warn_referenced(vehicle)
+            self.refresh_table()
+
+    def warn_referenced(self,vehicle):
+        """还有订单或罚款引用它时提示不能删除，返回是否有引用"""
+        n_orders,n_fines=count_dependents("vehicle_id",vehicle["id"])
+        if n_orders or n_fines:
+            QMessageBox.warning(self,tr("delete_vehicle"),tr("delete_referenced").format(vehicle["plate"],n_orders,n_fines))
+        return bool(n_orders or n_fines)
 
     def edit_vehicle(self,row,column):
-        result=self.get_selected_vehicle(row)
-        if not result:return
-        idx,vehicle=result
+        vehicle=self.get_selected_vehicle(row)
+        if not vehicle:return
         dialog=AddVehicleDialog(self,vehicle)
         if dialog.exec_():
             data=dialog.get_data()
@@ -256,26 +270,19 @@ class VehiclePage(QWidget):
                 QMessageBox.warning(self,tr("tip"),tr("plate_required"));return
             if not data["year"].isdigit():
                 QMessageBox.warning(self,tr("tip"),tr("year_number"));return
-            if any(v["plate"]==data["plate"] and v is not vehicle for v in vehicle_data):
-                QMessageBox.warning(self,tr("tip"),tr("plate_exists"));return
             data["id"]=vehicle["id"]
-            vehicle_data[idx]=data; save_all_data(); self.refresh_table()
+            try: update_vehicle(data)
+            except DuplicateError:
+                QMessageBox.warning(self,tr("tip"),tr("plate_exists"));return
+            self.refresh_table()
 
-    def prev_page(self):
-        if self.current_page>1:self.current_page-=1; self.refresh_table()
-    def next_page(self):
-        total=len(self.get_filtered_data()); total_pages=max(1,(total+self.page_size-1)//self.page_size)
-        if self.current_page<total_pages:self.current_page+=1; self.refresh_table()
 
     def export_csv(self):
-        path,_=QFileDialog.getSaveFileName(self,tr("export_csv"),"车辆列表.csv","CSV Files (*.csv)")
+        path,_=QFileDialog.getSaveFileName(self,tr("export_csv"),EXPORT_FILE_NAMES["vehicles"],"CSV Files (*.csv)")
+        if not path:return
+        start_export(self,path,"vehicles",self.pager.search,self.pager.sort)
+
+    def import_csv(self):
+        path,_=QFileDialog.getOpenFileName(self,tr("import_csv"),"","CSV Files (*.csv)")
         if not path:return
-        try:
-            with open(path,"w",newline='',encoding="utf-8-sig")as f:
-                writer=csv.writer(f)
-                writer.writerow([tr("vehicle_id"),tr("license_plate"),tr("model"),tr("year"),tr("insurance_expiry"),tr("mileage"),tr("monthly_price"),tr("deposit")])
-                for v in self.get_filtered_data():
-                    writer.writerow([v.get("id"),v["plate"],v["model"],v["year"],v["insurance"],v["mileage"],v["monthly_price"],v["deposit"]])
-            QMessageBox.information(self,tr("export_csv"),tr("export_success"))
-        except Exception as e:
-            QMessageBox.critical(self,tr("export_csv"),tr("export_failed")+"\n"+str(e))
\ No newline at end of file
+        start_import(self,path,"vehicles",self.refresh_table)
\ No newline at end of file
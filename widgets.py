@@ -0,0 +1,246 @@
+# widgets.py —— 各管理页面共用的小部件
+
+from PyQt5.QtWidgets import (
+    QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QLabel, QSpinBox,
+    QDialog, QTableWidget, QTableWidgetItem, QProgressDialog, QMessageBox
+)
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from i18n import tr
+from data import search_all
+from workers import SearchWorker, ExportWorker, ImportWorker
+
+SEARCH_DEBOUNCE_MS = 250  # 停止输入多久后才开始搜索
+
+# 实体名 -> 侧边栏上的名称
+ENTITY_LABELS = {"vehicles": "vehicle", "customers": "customer", "orders": "order", "fines": "fine"}
+
+
+class PageBar(QWidget):
+    """表格下方的分页栏：首页 / 上一页 / 页码跳转 / 下一页 / 末页，翻页交给 data.KeysetPager"""
+    page_changed = pyqtSignal()
+
+    def __init__(self, pager, parent=None):
+        super().__init__(parent)
+        self.pager = pager
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.btn_first = QPushButton(tr("first_page"))
+        self.btn_prev = QPushButton(tr("prev_page"))
+        self.lbl_page = QLabel()
+        self.spin_page = QSpinBox()
+        self.spin_page.setMinimum(1)
+        self.btn_jump = QPushButton(tr("jump_page"))
+        self.btn_next = QPushButton(tr("next_page"))
+        self.btn_last = QPushButton(tr("last_page"))
+
+        layout.addStretch()
+        for w in (self.btn_first, self.btn_prev, self.lbl_page, self.spin_page,
+                  self.btn_jump, self.btn_next, self.btn_last):
+            layout.addWidget(w)
+        layout.addStretch()
+
+        self.btn_first.clicked.connect(lambda: self._move(self.pager.first))
+        self.btn_prev.clicked.connect(lambda: self._move(self.pager.prev))
+        self.btn_next.clicked.connect(lambda: self._move(self.pager.next))
+        self.btn_last.clicked.connect(lambda: self._move(self.pager.last))
+        self.btn_jump.clicked.connect(self.jump)
+        self.spin_page.lineEdit().returnPressed.connect(self.jump)
+
+    def jump(self):
+        self._move(lambda: self.pager.goto(self.spin_page.value()))
+
+    def _move(self, action):
+        action()
+        self.update_state()
+        self.page_changed.emit()
+
+    def update_state(self):
+        p = self.pager
+        self.lbl_page.setText(tr("page_info").format(p.page, p.total_pages, p.total))
+        self.spin_page.setMaximum(p.total_pages)
+        self.btn_first.setEnabled(p.page > 1)
+        self.btn_prev.setEnabled(p.page > 1)
+        self.btn_next.setEnabled(p.page < p.total_pages)
+        self.btn_last.setEnabled(p.page < p.total_pages)
+
+    def refresh_texts(self):
+        self.btn_first.setText(tr("first_page"))
+        self.btn_prev.setText(tr("prev_page"))
+        self.btn_jump.setText(tr("jump_page"))
+        self.btn_next.setText(tr("next_page"))
+        self.btn_last.setText(tr("last_page"))
+        self.update_state()
+
+
+class LiveSearch(QObject):
+    """搜索框边输入边搜：停顿 SEARCH_DEBOUNCE_MS 后在后台线程查询，新的输入会取消还没跑完的查询；
+    第一批结果到了就换掉表格内容，本页其余的行随后一批批接到表格末尾"""
+
+    def __init__(self, edit, model, page_bar, parent=None):
+        super().__init__(parent)
+        self.edit = edit
+        self.model = model
+        self.pager = model.pager
+        self.page_bar = page_bar
+        self.worker = None
+        self.running = set()    # 已取消但还没退出的线程也要留着引用，等它们结束
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.timer.timeout.connect(self.run)
+        edit.textChanged.connect(self.timer.start)
+        page_bar.page_changed.connect(self.cancel)
+
+    def run(self):
+        self.cancel()
+        worker = SearchWorker(self.pager.entity, self.edit.text().strip(), self.pager.sort,
+                              self.pager.page_size, self.pager.fetch_size)
+        worker.chunk.connect(lambda snap: self.on_chunk(worker, snap))
+        worker.failed.connect(lambda message: self.on_failed(worker, message))
+        worker.finished.connect(lambda: self.on_finished(worker))
+        self.worker = worker
+        self.running.add(worker)
+        worker.start()
+
+    def cancel(self):
+        """放弃还没生效的输入和正在跑的查询（点了搜索按钮、翻页时调用）"""
+        self.timer.stop()
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        self.model.streaming = False
+
+    def stop(self):
+        """退出前：取消并等所有后台查询结束"""
+        self.cancel()
+        for worker in list(self.running):
+            worker.wait()
+
+    def on_chunk(self, worker, snap):
+        if worker is not self.worker:
+            return
+        if not self.model.streaming:
+            if snap.sort != self.pager.sort:
+                self.run()  # 查询途中换了排序，按新的排序重查
+                return
+            self.pager.adopt(snap)
+            self.model.streaming = True
+            self.model.reset()
+            self.page_bar.update_state()
+            return
+        # 这期间表格被翻页、排序或增删改刷新过，后面的批次就不要了
+        same = ((snap.page, snap.search, snap.sort) == (self.pager.page, self.pager.search, self.pager.sort)
+                and [r["id"] for r in snap.rows[:len(self.pager.rows)]] == [r["id"] for r in self.pager.rows])
+        if not same:
+            self.cancel()
+            return
+        self.pager.adopt(snap)
+        self.model.sync_rows()
+
+    def on_failed(self, worker, message):
+        """查询出错（如数据库被锁）：结束流式接收，提示用户，表格保留原来的内容"""
+        if worker is not self.worker:
+            return
+        self.worker = None
+        self.model.streaming = False
+        QMessageBox.warning(self.edit, tr("search"), tr("search_failed") + "\n" + message)
+
+    def on_finished(self, worker):
+        self.running.discard(worker)
+        worker.deleteLater()
+        if worker is self.worker:
+            self.worker = None
+            self.model.streaming = False
+
+
+_file_workers = set()   # 正在导出/导入的后台线程，退出前要等它们结束
+
+
+def _run_with_progress(parent, worker, title, label):
+    """给文件任务配一个不模态、可取消的进度框，然后启动线程"""
+    dialog = QProgressDialog(label, tr("cancel"), 0, 100, parent)
+    dialog.setWindowTitle(title)
+    dialog.setAutoClose(False)
+    dialog.setAutoReset(False)
+
+    def on_progress(done, total):
+        dialog.setMaximum(max(total, 1))
+        dialog.setValue(done)
+
+    def on_finished():
+        _file_workers.discard(worker)
+        dialog.close()
+        worker.deleteLater()
+
+    worker.progress.connect(on_progress)
+    worker.finished.connect(on_finished)
+    dialog.canceled.connect(worker.requestInterruption)
+    _file_workers.add(worker)
+    dialog.show()
+    worker.start()
+    return worker
+
+
+def start_export(parent, path, entity=None, search="", sort=()):
+    """后台导出到 path（entity 为空时全部打包成 zip），进度框不模态，可取消"""
+    title = tr("export_csv") if entity else tr("export_all")
+    worker = ExportWorker(path, entity, search, sort)
+    worker.succeeded.connect(lambda p: QMessageBox.information(parent, title, tr("export_success") + "\n" + p))
+    worker.failed.connect(lambda msg: QMessageBox.critical(parent, title, tr("export_failed") + "\n" + msg))
+    return _run_with_progress(parent, worker, title, tr("export_progress"))
+
+
+def start_import(parent, path, entity, done=None):
+    """后台把 CSV 导入 entity；结束后（含取消、失败，已提交的块仍在库里）调用 done() 刷新页面"""
+    title = tr("import_csv")
+    worker = ImportWorker(path, entity)
+
+    def on_succeeded(imported, failed, report):
+        msg = tr("import_result").format(imported, failed)
+        if report:
+            msg += "\n" + tr("import_report") + "\n" + report
+        (QMessageBox.warning if failed else QMessageBox.information)(parent, title, msg)
+
+    worker.succeeded.connect(on_succeeded)
+    worker.failed.connect(lambda msg: QMessageBox.critical(parent, title, tr("import_failed") + "\n" + msg))
+    if done:
+        worker.finished.connect(done)
+    return _run_with_progress(parent, worker, title, tr("import_progress"))
+
+
+def stop_file_workers():
+    """退出前：取消并等所有导出/导入线程结束（未完成的导出临时文件会被删掉）"""
+    for worker in list(_file_workers):
+        worker.requestInterruption()
+        worker.wait()
+
+
+class GlobalSearchDialog(QDialog):
+    """全局搜索结果：四类记录按相关度混排，双击跳到对应页面"""
+    open_record = pyqtSignal(str, int)   # entity, id
+
+    def __init__(self, text, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(tr("global_search") + " - " + text)
+        self.resize(640, 420)
+        layout = QVBoxLayout(self)
+        self.results = search_all(text)
+        self.table = QTableWidget(len(self.results), 3)
+        self.table.setHorizontalHeaderLabels([tr("search_type"), "ID", tr("search_match")])
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        for row, (entity, rid, snippet) in enumerate(self.results):
+            self.table.setItem(row, 0, QTableWidgetItem(tr(ENTITY_LABELS[entity])))
+            self.table.setItem(row, 1, QTableWidgetItem(str(rid)))
+            self.table.setItem(row, 2, QTableWidgetItem(snippet))
+        self.table.cellDoubleClicked.connect(self.choose)
+        layout.addWidget(self.table)
+        if not self.results:
+            layout.addWidget(QLabel(tr("no_result")))
+
+    def choose(self, row, column):
+        entity, rid, _ = self.results[row]
+        self.open_record.emit(entity, rid)
+        self.accept()
@@ -0,0 +1,141 @@
+# workers.py —— 放到后台线程执行的耗时任务，界面线程只接收信号
+
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+from i18n import tr
+from data import backup_db, open_conn, KeysetPager
+from export import export_csv, export_bundle
+from importer import import_csv
+
+
+class Cancelled(Exception):
+    """用户点了取消"""
+
+
+class BackupWorker(QThread):
+    """在线备份数据库：按步复制页面，界面线程照常读写"""
+    progress = pyqtSignal(int, int)     # 已复制页数, 总页数
+    succeeded = pyqtSignal(str)         # 备份文件路径
+    failed = pyqtSignal(str)            # 错误信息
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+
+    def _on_step(self, remaining, total):
+        if self.isInterruptionRequested():
+            raise Cancelled()
+        self.progress.emit(total - remaining, total)
+
+    def run(self):
+        try:
+            result = backup_db(self.path, self._on_step)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        if result == "ok":
+            self.succeeded.emit(self.path)
+        else:
+            self.failed.emit(tr("backup_integrity_failed") + result)
+
+
+class ExportWorker(QThread):
+    """后台导出 CSV：entity 为空时把所有列表打包成 zip"""
+    progress = pyqtSignal(int, int)     # 已写行数, 总行数
+    succeeded = pyqtSignal(str)         # 导出文件路径
+    failed = pyqtSignal(str)            # 错误信息
+
+    def __init__(self, path, entity=None, search="", sort=(), parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.entity = entity
+        self.search, self.sort = search, list(sort)
+
+    def _on_step(self, done, total):
+        if self.isInterruptionRequested():
+            raise Cancelled()
+        self.progress.emit(done, total)
+
+    def run(self):
+        try:
+            if self.entity is None:
+                export_bundle(self.path, self._on_step)
+            else:
+                export_csv(self.path, self.entity, self.search, self.sort, self._on_step)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.succeeded.emit(self.path)
+
+
+class ImportWorker(QThread):
+    """后台导入 CSV：进度按已读字节的千分比报告"""
+    progress = pyqtSignal(int, int)     # 已读千分比, 1000
+    succeeded = pyqtSignal(int, int, str)   # 导入行数, 出错行数, 错误报告路径
+    failed = pyqtSignal(str)            # 错误信息
+
+    def __init__(self, path, entity, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.entity = entity
+
+    def _on_step(self, done, total):
+        if self.isInterruptionRequested():
+            raise Cancelled()
+        self.progress.emit(done * 1000 // max(total, 1), 1000)
+
+    def run(self):
+        try:
+            result = import_csv(self.path, self.entity, self._on_step)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.succeeded.emit(*result)
+
+
+class SearchWorker(QThread):
+    """在自己的连接上执行一次列表搜索：先数总数、读第一批，再把本页其余的行一批批读出来。
+    每读完一批发出一次 chunk（分页器快照）；cancel() 会中断正在执行的 SQL"""
+    chunk = pyqtSignal(object)          # KeysetPager 快照
+    failed = pyqtSignal(str)
+
+    def __init__(self, entity, search, sort, page_size, fetch_size, parent=None):
+        super().__init__(parent)
+        self.args = (entity, page_size, fetch_size)
+        self.search, self.sort = search, list(sort)
+        self.conn = None
+        self.lock = threading.Lock()    # interrupt() 和 close() 不能交错：连接只在持锁时打开/关闭/中断
+
+    def cancel(self):
+        self.requestInterruption()
+        with self.lock:
+            if self.conn is not None:
+                self.conn.interrupt()
+
+    def run(self):
+        with self.lock:
+            if self.isInterruptionRequested():
+                return
+            self.conn = open_conn()
+        try:
+            pager = KeysetPager(*self.args, conn=self.conn)
+            pager.set_query(search=self.search, sort=self.sort)
+            while not self.isInterruptionRequested():
+                self.chunk.emit(pager.snapshot())
+                if not pager.has_more:
+                    break
+                pager.more()
+        except Exception as e:
+            # 被 cancel() 中断的查询也会抛 OperationalError，那不算出错
+            if not self.isInterruptionRequested():
+                self.failed.emit(str(e))
+        finally:
+            with self.lock:
+                conn, self.conn = self.conn, None
+                conn.close()